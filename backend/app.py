@@ -1,17 +1,20 @@
 import os
-from datetime import timedelta
-from flask import Flask, request, jsonify
+from datetime import date, timedelta
+from flask import Flask, request, jsonify, abort
 from flask_cors import CORS
 from flask_jwt_extended import (
     JWTManager, create_access_token, jwt_required, get_jwt_identity
 )
 from sqlalchemy import func
 
-from .models import db, User, Place, Rating, Comment, Bookmark
+from .models import db, User, Place, Rating, Comment, Bookmark, Event
 from .recommender import RecommenderService
+from .prefs import UserPrefStore
+from .ingest import RatingWriteBehind
+from .cache import PlaceCardCache, json_response, json_array, dumps
 from .utils import (
-    hash_password, check_password, seed_places_if_empty,
-    place_to_dict, display_price
+    hash_password, check_password, seed_places_if_empty, seed_events_if_empty, ensure_indexes,
+    place_to_dict, event_to_dict, display_price
 )
 
 
@@ -31,7 +34,9 @@ def create_app():
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        ensure_indexes(db)
         seed_places_if_empty(db)
+        seed_events_if_empty(db)
         print("[DB CONNECTED]", db.engine.url)
 
     # Path model artefak
@@ -44,8 +49,39 @@ def create_app():
         cbf_dir=os.environ.get("CBF_DIR", cbf_dir),
         cf_dir=os.environ.get("CF_DIR", cf_dir),
         fallback_data_dir=data_dir,
+        hybrid_alpha=float(os.environ.get("HYBRID_ALPHA", 0.6)),
+        similar_topn=int(os.environ.get("SIMILAR_TOPN", 20)),
+        similar_build_max=int(os.environ.get("SIMILAR_BUILD_MAX", 20000)),
+        candidate_budget=int(os.environ.get("RECS_CANDIDATES", 0)),
+        candidate_neighbors=int(os.environ.get("RECS_CAND_NEIGHBORS", 10)),
+        candidate_popular=int(os.environ.get("RECS_CAND_POPULAR", 50)),
+        accumulator_size=int(os.environ.get("RECS_ACCUMULATORS", 0)),
+        cf_engine=os.environ.get("CF_ENGINE", "itemsim"),
+        n_shards=int(os.environ.get("RECS_SHARDS", 1)),
+        shard_lanes=int(os.environ.get("RECS_SHARD_LANES", 2)),
+        shard_timeout=float(os.environ.get("RECS_SHARD_TIMEOUT", 10)),
     )
 
+    # Write-behind rating (opsional): event rating dicatat ke log lalu di-flush batch di latar.
+    app.ratings_wb = None
+    if os.environ.get("RATINGS_WRITE_BEHIND", "0").lower() in ("1", "true", "yes"):
+        app.ratings_wb = RatingWriteBehind(
+            app,
+            log_path=os.environ.get("RATINGS_WAL", os.path.join(app.instance_path, "ratings_wal.jsonl")),
+            flush_ms=int(os.environ.get("RATINGS_FLUSH_MS", 20)),
+        )
+
+    # PREFS_CACHE_TTL membatasi umur memo: invalidasi tidak menyeberang antar worker.
+    app.prefs = UserPrefStore(app.recs, max_users=int(os.environ.get("PREFS_CACHE_SIZE", 0)),
+                              pending=app.ratings_wb,
+                              ttl=float(os.environ.get("PREFS_CACHE_TTL", 30)))
+
+    # Cache kartu tempat ter-serialisasi; invalidasi lewat event ORM + flush write-behind.
+    app.cards = PlaceCardCache(ttl=float(os.environ.get("CARD_CACHE_TTL", 60)))
+    app.cards.watch(Place, Rating)
+    if app.ratings_wb is not None:
+        app.ratings_wb.on_flush.append(app.cards.bump_places)
+
     JWTManager(app)
 
     # ===================== Helpers =====================
@@ -65,9 +101,32 @@ def create_app():
     def get_my_rating(uid: int | None, pid: int) -> float | None:
         if not uid:
             return None
+        if app.ratings_wb is not None:
+            mine = app.ratings_wb.pending_rating(uid, pid)
+            if mine is not None:
+                return mine
         row = Rating.query.filter_by(user_id=uid, place_id=pid).first()
         return float(row.rating) if row else None
 
+    def build_list_cards(pids):
+        rows = Place.query.filter(Place.id.in_(pids)).all()
+        return {p.id: place_to_dict(p) for p in rows}
+
+    def build_detail_cards(pids):
+        aggs = dict(
+            (pid, (avg, cnt)) for pid, avg, cnt in db.session.query(
+                Rating.place_id, func.avg(Rating.rating), func.count(Rating.id)
+            ).filter(Rating.place_id.in_(pids)).group_by(Rating.place_id)
+        )
+        out = {}
+        for p in Place.query.filter(Place.id.in_(pids)).all():
+            avg, cnt = aggs.get(p.id, (None, 0))
+            d = place_to_dict(p, detail=True)
+            # pastikan yang tampil adalah agregat terbaru
+            d.update({"rating": float(avg or 0.0), "rating_count": int(cnt or 0)})
+            out[p.id] = d
+        return out
+
     # ===================== AUTH =====================
     @app.post("/api/auth/register")
     def register():
@@ -120,60 +179,78 @@ def create_app():
         if city: query = query.filter(Place.city.ilike(f"%{city}%"))
         if cat:  query = query.filter(Place.category.ilike(f"%{cat}%"))
 
-        rows = query.limit(limit).all()
-        return jsonify([place_to_dict(p) for p in rows])
+        ids = [pid for (pid,) in query.with_entities(Place.id).limit(limit)]
+        return json_response(json_array(app.cards.cards("list", ids, build_list_cards)))
 
     @app.get("/api/places/<int:pid>")
     @jwt_required(optional=True)
     def place_detail(pid: int):
-        p = Place.query.get_or_404(pid)
-
-        # Hitung ulang agregat (aman & cepat untuk 1 tempat)
-        avg, cnt = db.session.query(
-            func.avg(Rating.rating), func.count(Rating.id)
-        ).filter(Rating.place_id == pid).first()
-        avg = float(avg or 0.0)
-        cnt = int(cnt or 0)
+        card = app.cards.cards("detail", [pid], build_detail_cards)
+        if not card:
+            abort(404)
 
         uid_raw = get_jwt_identity()
         uid = int(uid_raw) if uid_raw is not None else None
         mine = get_my_rating(uid, pid)
 
-        data = place_to_dict(p, detail=True)
-        # pastikan yang tampil adalah agregat terbaru
-        data.update({
-            "rating": avg,
-            "rating_count": cnt,
-            "my_rating": mine,
-        })
-        return jsonify(data)
+        # kartu detail di-cache tanpa my_rating; field per-user disisipkan ke bytes-nya
+        body = card[0][:-1] + b',"my_rating":' + dumps(mine) + b"}"
+        return json_response(body)
 
-    @app.get("/api/places/sample")
-    def sample_places():
-        n = int(request.args.get("n", 18))
-        df = app.recs.sample_places(n=n)
+    @app.get("/api/places/<int:pid>/similar")
+    def similar_places(pid: int):
+        k = int(request.args.get("k", 10))
+        df = app.recs.similar_places(pid, k=k)
         ids = [int(x) for x in df["id"].tolist()]
         rows = Place.query.filter(Place.id.in_(ids)).all()
         price_map = {r.id: display_price(r.price_str, r.price_num) for r in rows}
+
         out = []
         for _, r in df.iterrows():
-            pid = int(r["id"])
+            rid = int(r["id"])
             out.append({
-                "id": pid,
+                "place_id": rid,
                 "place_name": r.get("place_name", ""),
                 "city": r.get("city", ""),
                 "category": r.get("category", ""),
-                "price": price_map.get(pid, "-"),
+                "price": price_map.get(rid, "-"),
                 "rating": float(r.get("rating", 0.0) or 0.0),
                 "image": r.get("image", ""),
+                "similar_score": float(r.get("similar_score", 0.0) or 0.0),
             })
         return jsonify(out)
 
-    # ===================== RECOMMENDATIONS =====================
-    @app.get("/api/recs/anonymous")
-    def recs_anonymous():
+    @app.get("/api/places/sample")
+    def sample_places():
+        n = int(request.args.get("n", 18))
+
+        def build():
+            df = app.recs.sample_places(n=n)
+            ids = [int(x) for x in df["id"].tolist()]
+            rows = Place.query.filter(Place.id.in_(ids)).all()
+            price_map = {r.id: display_price(r.price_str, r.price_num) for r in rows}
+            out = []
+            for _, r in df.iterrows():
+                pid = int(r["id"])
+                out.append({
+                    "id": pid,
+                    "place_name": r.get("place_name", ""),
+                    "city": r.get("city", ""),
+                    "category": r.get("category", ""),
+                    "price": price_map.get(pid, "-"),
+                    "rating": float(r.get("rating", 0.0) or 0.0),
+                    "image": r.get("image", ""),
+                })
+            return out
+        return json_response(app.cards.body(("sample", n), build))
+
+    @app.get("/api/search")
+    def search_places():
+        q = request.args.get("q", "").strip()
         k = int(request.args.get("k", 20))
-        df = app.recs.top_rated(k=k)
+        if not q:
+            return jsonify([])
+        df = app.recs.search_text(q, k=k)
         ids = [int(x) for x in df["id"].tolist()]
         rows = Place.query.filter(Place.id.in_(ids)).all()
         price_map = {r.id: display_price(r.price_str, r.price_num) for r in rows}
@@ -189,16 +266,94 @@ def create_app():
                 "price": price_map.get(pid, "-"),
                 "rating": float(r.get("rating", 0.0) or 0.0),
                 "image": r.get("image", ""),
+                "search_score": float(r.get("search_score", 0.0) or 0.0),
             })
         return jsonify(out)
 
+    # ===================== EVENTS =====================
+    @app.get("/api/events")
+    def list_events():
+        city = request.args.get("city", "").strip()
+        limit = int(request.args.get("limit", 20))
+        upcoming = request.args.get("upcoming", "0").lower() in ("1", "true", "yes")
+        try:
+            d_from = date.fromisoformat(request.args["from"]) if request.args.get("from") else None
+            d_to = date.fromisoformat(request.args["to"]) if request.args.get("to") else None
+        except ValueError:
+            return jsonify({"error": "Format tanggal harus YYYY-MM-DD"}), 400
+
+        # Filter & urutan memakai kolom index yang sama → range scan tanpa sort:
+        # (lower(city), end_date) kalau ada city, selain itu end_date / start_date.
+        query = Event.query
+        if upcoming:
+            d_from = max(d_from or date.today(), date.today())
+        if d_from: query = query.filter(Event.end_date >= d_from)     # overlap jendela [from, to]
+        if d_to:   query = query.filter(Event.start_date <= d_to)
+        if city:   query = query.filter(func.lower(Event.city) == city.lower())
+
+        if d_from:
+            order = Event.end_date.asc()                               # yang paling dulu selesai duluan
+        elif d_to and not city:
+            order = Event.start_date.desc()
+        else:
+            order = Event.end_date.desc()
+        rows = query.order_by(order).limit(limit).all()
+        return jsonify([event_to_dict(e) for e in rows])
+
+    @app.get("/api/places/<int:pid>/events")
+    def place_events(pid: int):
+        limit = int(request.args.get("limit", 10))
+        upcoming = request.args.get("upcoming", "0").lower() in ("1", "true", "yes")
+        # Satu query: places (PK) → events lewat index (lower(city), end_date).
+        query = db.session.query(Event)\
+            .join(Place, func.lower(Place.city) == func.lower(Event.city))\
+            .filter(Place.id == pid)
+        if upcoming:
+            query = query.filter(Event.end_date >= date.today())
+            query = query.order_by(Event.end_date.asc())
+        else:
+            query = query.order_by(Event.end_date.desc())
+        return jsonify([event_to_dict(e) for e in query.limit(limit).all()])
+
+    # ===================== RECOMMENDATIONS =====================
+    @app.get("/api/recs/anonymous")
+    def recs_anonymous():
+        k = int(request.args.get("k", 20))
+
+        def build():
+            df = app.recs.top_rated(k=k)
+            ids = [int(x) for x in df["id"].tolist()]
+            rows = Place.query.filter(Place.id.in_(ids)).all()
+            price_map = {r.id: display_price(r.price_str, r.price_num) for r in rows}
+
+            out = []
+            for _, r in df.iterrows():
+                pid = int(r["id"])
+                out.append({
+                    "place_id": pid,
+                    "place_name": r.get("place_name", ""),
+                    "city": r.get("city", ""),
+                    "category": r.get("category", ""),
+                    "price": price_map.get(pid, "-"),
+                    "rating": float(r.get("rating", 0.0) or 0.0),
+                    "image": r.get("image", ""),
+                })
+            return out
+        return json_response(app.cards.body(("anonymous", k), build))
+
     @app.get("/api/recs/hybrid")
     @jwt_required()
     def recs_hybrid():
         uid = int(get_jwt_identity())
-        rows = Rating.query.filter_by(user_id=uid).all()
-        user_ratings = {int(r.place_id): float(r.rating) for r in rows}
-        if len(user_ratings) == 0:
+        cols, vals = app.prefs.get(uid)
+        mask_seen = True
+        if len(cols) == 0:
+            # Cold-start: kalau ada ?q=..., pakai hasil pencarian teks sebagai bibit preferensi.
+            q = request.args.get("q", "").strip()
+            if q:
+                cols, vals = app.recs.ratings_to_cf(app.recs.seed_ratings_from_query(q))
+                mask_seen = False
+        if len(cols) == 0:
             return jsonify({
                 "need_onboarding": True,
                 "message": "Belum ada preferensi. Klik beberapa kartu favorit untuk memulai."
@@ -206,7 +361,16 @@ def create_app():
 
         k = int(request.args.get("k", 20))
         alpha = float(os.environ.get("HYBRID_ALPHA", 0.6))
-        df = app.recs.recommend_hybrid_for_user(user_ratings, k=k, alpha=alpha)
+        filters = {
+            "city": request.args.get("city", "").strip() or None,
+            "category": request.args.get("category", "").strip() or None,
+            "min_price": request.args.get("min_price", type=float),
+            "max_price": request.args.get("max_price", type=float),
+        }
+        df = app.recs.recommend_hybrid_sparse(
+            cols, vals, k=k, alpha=alpha, mask_seen=mask_seen, filters=filters,
+            uid=uid if mask_seen else None,
+        )
 
         ids = [int(x) for x in df.get("place_id", df.get("id"))]
         rows = Place.query.filter(Place.id.in_(ids)).all()
@@ -232,17 +396,31 @@ def create_app():
     @jwt_required()
     def onboarding_like():
         d = request.get_json(force=True) or {}
-        ids = list(map(int, d.get("place_ids", [])))
+        ids = list(dict.fromkeys(map(int, d.get("place_ids", []))))   # unik, urutan tetap
         if not ids:
             return jsonify({"error": "place_ids kosong"}), 400
         uid = int(get_jwt_identity())
+        if app.ratings_wb is not None:
+            old = app.prefs.get_map(uid) if app.recs.accumulator_size > 0 else {}
+            valid = {pid for (pid,) in db.session.query(Place.id).filter(Place.id.in_(ids))}
+            changes = [(pid, old.get(pid, 0.0), 5.0) for pid in ids if pid in valid]
+            for pid, _, new in changes:
+                app.ratings_wb.submit(uid, pid, new)
+            app.prefs.invalidate(uid)
+            app.recs.apply_rating_deltas(uid, changes)
+            return jsonify({"ok": True, "count": len(ids), "queued": True})
+
+        changes = []
         for pid in ids:
             if not Place.query.get(pid):
                 continue
             row = Rating.query.filter_by(user_id=uid, place_id=pid).first()
+            changes.append((pid, row.rating if row else 0.0, 5.0))
             if row: row.rating = 5.0
             else:   db.session.add(Rating(user_id=uid, place_id=pid, rating=5.0))
         db.session.commit()
+        app.prefs.invalidate(uid)
+        app.recs.apply_rating_deltas(uid, changes)
         # opsional: tidak perlu recompute massal di sini
         return jsonify({"ok": True, "count": len(ids)})
 
@@ -257,10 +435,24 @@ def create_app():
         if val < 1 or val > 5:
             return jsonify({"error": "Rating harus 1..5"}), 400
 
+        if app.ratings_wb is not None:
+            # Write-behind: cukup catat event; agregat menyusul saat flush.
+            # place divalidasi di sini karena DB baru tersentuh saat flush.
+            if not db.session.query(Place.id).filter(Place.id == pid).first():
+                return jsonify({"error": "Place tidak ditemukan"}), 404
+            old = app.prefs.get_map(uid).get(pid, 0.0) if app.recs.accumulator_size > 0 else 0.0
+            app.ratings_wb.submit(uid, pid, val)
+            app.prefs.invalidate(uid)
+            app.recs.apply_rating_deltas(uid, [(pid, old, val)])
+            return jsonify({"ok": True, "my_rating": val, "avg": None, "count": None, "queued": True})
+
         row = Rating.query.filter_by(user_id=uid, place_id=pid).first()
+        old = row.rating if row else 0.0
         if row: row.rating = val
         else:   db.session.add(Rating(user_id=uid, place_id=pid, rating=val))
         db.session.commit()
+        app.prefs.invalidate(uid)
+        app.recs.apply_rating_deltas(uid, [(pid, old, val)])
 
         avg, cnt = recompute_place_rating(pid)
         return jsonify({"ok": True, "my_rating": val, "avg": avg, "count": cnt})
@@ -270,7 +462,10 @@ def create_app():
     def my_ratings():
         uid = int(get_jwt_identity())
         rows = Rating.query.filter_by(user_id=uid).all()
-        return jsonify([{"place_id": r.place_id, "rating": r.rating} for r in rows])
+        mine = {r.place_id: r.rating for r in rows}
+        if app.ratings_wb is not None:
+            mine.update(app.ratings_wb.pending_for(uid))
+        return jsonify([{"place_id": pid, "rating": r} for pid, r in mine.items()])
 
     @app.get("/api/ratings/for_place")
     @jwt_required(optional=True)
@@ -360,21 +555,11 @@ def create_app():
     @jwt_required()
     def list_bookmarks():
         uid = int(get_jwt_identity())
-        rows = db.session.query(Bookmark, Place)\
-            .join(Place, Bookmark.place_id == Place.id)\
-            .filter(Bookmark.user_id == uid).all()
-        out = []
-        for b, p in rows:
-            out.append({
-                "place_id": p.id,
-                "place_name": p.place_name,
-                "city": p.city,
-                "category": p.category,
-                "price": display_price(p.price_str, p.price_num),
-                "rating": p.rating_avg or 0.0,
-                "image": p.image,
-            })
-        return jsonify(out)
+        ids = [pid for (pid,) in db.session.query(Bookmark.place_id)
+               .join(Place, Bookmark.place_id == Place.id)
+               .filter(Bookmark.user_id == uid)]
+        # kartu bookmark = kartu list (place_to_dict)
+        return json_response(json_array(app.cards.cards("list", ids, build_list_cards)))
 
     return app
 
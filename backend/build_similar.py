@@ -0,0 +1,46 @@
+"""
+Bangun tabel "tempat serupa" offline → cf_dir/similar_topn.npz.
+
+Build tabel ini O(n²) (skor hybrid tiap item terhadap seluruh katalog), jadi untuk
+katalog besar jangan dikerjakan saat server start. Jalankan setelah artefak CBF/CF
+dilatih ulang; RecommenderService memuat artefaknya saat load selama item, engine,
+alpha & topn masih cocok (artefak yang lebih tua dari model diabaikan).
+
+Jalankan dari root repo:
+    python -m backend.build_similar --topn 20 --engine itemsim
+"""
+import argparse
+import os
+import time
+
+from .recommender import SIMILAR_FILE, RecommenderService
+
+
+def main():
+    base_dir = os.path.dirname(__file__)
+    ap = argparse.ArgumentParser(description="Build offline tabel tempat serupa (top-N per item).")
+    ap.add_argument("--topn", type=int, default=int(os.environ.get("SIMILAR_TOPN", 20)))
+    ap.add_argument("--alpha", type=float, default=float(os.environ.get("HYBRID_ALPHA", 0.6)))
+    ap.add_argument("--engine", default=os.environ.get("CF_ENGINE", "itemsim"), choices=["itemsim", "als"])
+    ap.add_argument("--out", default=None, help=f"default: <CF_DIR>/{SIMILAR_FILE}")
+    args = ap.parse_args()
+
+    svc = RecommenderService(
+        cbf_dir=os.environ.get("CBF_DIR", os.path.join(base_dir, "models", "cbf")),
+        cf_dir=os.environ.get("CF_DIR", os.path.join(base_dir, "models", "cf")),
+        fallback_data_dir=os.path.join(base_dir, "data"),
+        hybrid_alpha=args.alpha,
+        similar_topn=0,  # jangan load / build tabel lama
+        cf_engine=args.engine,
+    )
+    t0 = time.perf_counter()
+    svc.build_similar_table(args.topn)
+    if svc.similar_ids is None:
+        raise SystemExit("Tabel tidak dibangun (artefak CF/CBF kosong atau topn <= 0).")
+    path = svc.save_similar_table(args.out)
+    print(f"items={len(svc.item_ids)} topn={svc.similar_ids.shape[1]} engine={args.engine} "
+          f"alpha={args.alpha} → {path} ({time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
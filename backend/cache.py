@@ -0,0 +1,187 @@
+"""
+Cache kartu tempat yang sudah diserialisasi (JSON bytes) + respons kondisional.
+
+  - Kartu per (view, place_id) disimpan bersama versi place;
+    perubahan rating / baris places → bump_places(pids) → kartu lama tidak terpakai lagi.
+  - Body utuh (mis. sample / anonymous) disimpan per key + versi katalog.
+  - json_response(): ETag dari isi body, If-None-Match → 304, gzip/brotli kalau
+    klien menerima dan body cukup besar.
+Invalidasi otomatis: event ORM Place/Rating (dikumpulkan per session, dieksekusi
+setelah commit) + callback write-behind. TTL opsional menutup celah multi-worker.
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+import weakref
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+try:  # opsional: pip install brotli
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def dumps(obj) -> bytes:
+    # sort_keys sama dengan jsonify bawaan Flask
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+class PlaceCardCache:
+    def __init__(self, ttl: float = 0, max_bodies: int = 1024):
+        self.ttl = float(ttl)
+        self.max_bodies = int(max_bodies)
+        self.catalog_version = 0
+        self._place_ver: dict[int, int] = {}
+        self._cards: dict[tuple[str, int], tuple[int, float, bytes]] = {}
+        self._bodies: dict[tuple, tuple[int, float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    # ---------- Invalidasi ----------
+    def bump_places(self, pids):
+        """Rating / data place berubah → kartu place tsb & body agregat jadi usang."""
+        with self._lock:
+            for pid in pids:
+                pid = int(pid)
+                self._place_ver[pid] = self._place_ver.get(pid, 0) + 1
+            self.catalog_version += 1
+
+    def bump_catalog(self):
+        with self._lock:
+            self.catalog_version += 1
+            self._cards.clear()
+            self._bodies.clear()
+
+    def watch(self, place_model, rating_model):
+        """Ikut invalidasi dari event ORM Place & Rating (bump setelah commit)."""
+        _listen_model(place_model, lambda t: t.id)
+        _listen_model(rating_model, lambda t: t.place_id)
+        _watching.add(self)
+
+    # ---------- Lookup ----------
+    def _fresh(self, ts: float) -> bool:
+        return self.ttl <= 0 or (time.monotonic() - ts) < self.ttl
+
+    def cards(self, view: str, pids: list[int], build_many) -> list[bytes]:
+        """
+        Kartu JSON untuk `pids` (urutan dipertahankan). Yang belum ada / usang dibangun
+        sekaligus lewat build_many(missing_pids) → {pid: dict}.
+        """
+        out: dict[int, bytes] = {}
+        missing = []
+        with self._lock:
+            for pid in pids:
+                ver = self._place_ver.get(pid, 0)
+                hit = self._cards.get((view, pid))
+                if hit is not None and hit[0] == ver and self._fresh(hit[1]):
+                    out[pid] = hit[2]
+                else:
+                    missing.append(pid)
+            # versi dicatat SEBELUM build: bump di tengah jalan → kartu dianggap usang
+            ver_at = {pid: self._place_ver.get(pid, 0) for pid in missing}
+        if missing:
+            built = build_many(missing)
+            now = time.monotonic()
+            with self._lock:
+                for pid, d in built.items():
+                    pid = int(pid)
+                    b = dumps(d)
+                    self._cards[(view, pid)] = (ver_at[pid], now, b)
+                    out[pid] = b
+        return [out[p] for p in pids if p in out]
+
+    def body(self, key: tuple, build) -> bytes:
+        """Body utuh per key, berlaku selama versi katalog sama (dan belum lewat TTL)."""
+        with self._lock:
+            hit = self._bodies.get(key)
+            if hit is not None and hit[0] == self.catalog_version and self._fresh(hit[1]):
+                return hit[2]
+            ver = self.catalog_version
+        b = dumps(build())
+        with self._lock:
+            if len(self._bodies) >= self.max_bodies:
+                self._bodies.clear()
+            self._bodies[key] = (ver, time.monotonic(), b)
+        return b
+
+
+# ---------- Listener ORM (dipasang sekali per proses) ----------
+# create_app() bisa dipanggil berkali-kali (load test, dsb.): listener global tidak
+# ditambah per cache, cukup dispatch ke cache yang masih hidup (WeakSet).
+_watching: "weakref.WeakSet[PlaceCardCache]" = weakref.WeakSet()
+_pid_of: dict[type, object] = {}
+
+
+def _touch(mapper, connection, target):
+    s = object_session(target)
+    if s is None:
+        return
+    pid = _pid_of[mapper.class_](target)
+    s.info.setdefault("card_pids", set()).add(int(pid))
+
+
+def _listen_model(model, pid_of):
+    if model in _pid_of:
+        return
+    _pid_of[model] = pid_of
+    for ev in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, ev, _touch)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    pids = session.info.pop("card_pids", None)
+    if pids:
+        for cache in list(_watching):
+            cache.bump_places(pids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("card_pids", None)
+
+
+def json_array(items: list[bytes]) -> bytes:
+    return b"[" + b",".join(items) + b"]"
+
+
+def json_response(body: bytes, status: int = 200, min_compress: int = 1024) -> Response:
+    """Respons JSON dengan ETag, 304 untuk If-None-Match yang cocok, dan kompresi."""
+    tag = hashlib.blake2b(body, digest_size=12).hexdigest()
+    accept = request.headers.get("Accept-Encoding", "").lower()
+    enc = None
+    if len(body) >= min_compress:
+        if brotli is not None and "br" in accept:
+            enc = "br"
+        elif "gzip" in accept:
+            enc = "gzip"
+    # ETag per representasi; 304 mengulang validator representasi yang sama.
+    etag = f'"{tag}-{enc}"' if enc else f'"{tag}"'
+
+    inm = request.headers.get("If-None-Match", "")
+    sent = set()
+    for t in inm.split(","):
+        t = t.strip()
+        t = t[2:] if t.startswith("W/") else t
+        sent.add(t.strip('"').split("-")[0])
+    if status == 200 and (tag in sent or "*" in sent):
+        resp = Response(status=304)
+        resp.headers["ETag"] = etag
+        resp.headers["Vary"] = "Accept-Encoding"
+        return resp
+
+    if enc == "br":
+        body = brotli.compress(body, quality=5)
+    elif enc == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+
+    resp = Response(body, status=status, mimetype="application/json")
+    resp.headers["ETag"] = etag
+    resp.headers["Vary"] = "Accept-Encoding"
+    if enc:
+        resp.headers["Content-Encoding"] = enc
+    return resp
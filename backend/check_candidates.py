@@ -0,0 +1,63 @@
+"""
+Cek offline kualitas kandidat two-stage terhadap skor penuh.
+
+Untuk setiap user di eco_rating.csv: bandingkan Top-K skor penuh dengan Top-K
+dua tahap (kandidat → skor exact) dan laporkan recall@K + waktu per user.
+
+Jalankan dari root repo:
+    python -m backend.check_candidates --budgets 30,60,120 --k 10
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from .recommender import RecommenderService
+
+
+def main():
+    base_dir = os.path.dirname(__file__)
+    ap = argparse.ArgumentParser(description="Recall kandidat two-stage vs skor penuh.")
+    ap.add_argument("--ratings", default=os.path.join(base_dir, "data", "eco_rating.csv"))
+    ap.add_argument("--budgets", default="30,60,120", help="daftar candidate_budget, pisah koma")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--alpha", type=float, default=float(os.environ.get("HYBRID_ALPHA", 0.6)))
+    ap.add_argument("--neighbors", type=int, default=int(os.environ.get("RECS_CAND_NEIGHBORS", 10)))
+    ap.add_argument("--popular", type=int, default=int(os.environ.get("RECS_CAND_POPULAR", 50)))
+    args = ap.parse_args()
+
+    svc = RecommenderService(
+        cbf_dir=os.environ.get("CBF_DIR", os.path.join(base_dir, "models", "cbf")),
+        cf_dir=os.environ.get("CF_DIR", os.path.join(base_dir, "models", "cf")),
+        fallback_data_dir=os.path.join(base_dir, "data"),
+        hybrid_alpha=args.alpha,
+        candidate_neighbors=args.neighbors,
+        candidate_popular=args.popular,
+    )
+    df = pd.read_csv(args.ratings)
+    users = [
+        dict(zip(g["place_id"].astype(int), g["user_rating"].astype(float)))
+        for _, g in df.groupby("user_id")
+    ]
+
+    t0 = time.perf_counter()
+    for ur in users:
+        svc.recommend_hybrid_for_user(ur, k=args.k, alpha=args.alpha)
+    full_ms = (time.perf_counter() - t0) / len(users) * 1000
+    print(f"users={len(users)} items={len(svc.item_ids)} k={args.k} alpha={args.alpha}")
+    print(f"{'budget':>8} {'recall@k':>9} {'ms/user':>8}   (skor penuh: {full_ms:.2f} ms/user)")
+
+    for b in [int(x) for x in args.budgets.split(",") if x.strip()]:
+        rec = svc.candidate_recall(users, k=args.k, alpha=args.alpha, budget=b)
+        svc.candidate_budget = b
+        t0 = time.perf_counter()
+        for ur in users:
+            svc.recommend_hybrid_for_user(ur, k=args.k, alpha=args.alpha)
+        ms = (time.perf_counter() - t0) / len(users) * 1000
+        svc.candidate_budget = 0
+        print(f"{b:>8} {rec:>9.3f} {ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Evaluasi offline kualitas rekomendasi hybrid untuk tuning HYBRID_ALPHA & engine CF.
+
+  - Sumber rating: eco_rating.csv (default) atau tabel `ratings` (--database-url).
+  - Split per user:
+      * loo      : k rating acak per user ditahan sebagai test (leave-k-out)
+      * temporal : k rating TERAKHIR per user (created_at; untuk CSV = urutan baris)
+  - Tiap engine (itemsim / als) dilatih ulang HANYA dari split train, lalu skor
+    dihitung per batch user lewat RecommenderService.raw_scores_batch. Skor mentah
+    cukup sekali per engine; semua alpha hanya beda blend → sweep alpha murah.
+  - Metrik (vektor per batch): precision@K, recall@K, NDCG@K, hit-rate@K
+    (relevan = rating test ≥ --relevant) dan coverage katalog.
+  - Batch user dibagi ke ProcessPoolExecutor; hasil digabung jadi laporan markdown.
+
+Jalankan dari root repo:
+    python -m backend.evaluate --split loo --holdout 1 --k 10
+    python -m backend.evaluate --split temporal --database-url sqlite:///instance/eco.db \\
+        --alphas 0,0.2,0.4,0.6,0.8,1 --engines itemsim,als --jobs 4 --report eval_report.md
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from threadpoolctl import threadpool_limits
+
+from .mf import ALSEngine, ItemSimEngine
+from .recommender import RecommenderService, norm01
+
+
+# ---------- Data & split ----------
+def load_ratings_frame(ratings_csv=None, database_url=None) -> pd.DataFrame:
+    """DataFrame (user_id, place_id, rating, ts); ts = created_at atau urutan baris CSV."""
+    if database_url:
+        from sqlalchemy import create_engine
+        df = pd.read_sql("SELECT user_id, place_id, rating, created_at FROM ratings",
+                         create_engine(database_url))
+        df["ts"] = pd.to_datetime(df["created_at"]).astype("int64")
+        df = df.drop(columns=["created_at"])
+    else:
+        df = pd.read_csv(ratings_csv).rename(columns={"user_rating": "rating"})
+        df["ts"] = np.arange(len(df))
+    return df[["user_id", "place_id", "rating", "ts"]]
+
+
+def split_ratings(df: pd.DataFrame, item_ids: list, mode="loo", holdout=1, seed=42):
+    """
+    Matriks train & test (user × item, kolom = urutan CF) dari satu split.
+    User dengan rating ≤ holdout dilewati (tidak ada sisa untuk train).
+    """
+    col = {pid: j for j, pid in enumerate(item_ids)}
+    df = df[df["place_id"].isin(col)].copy()
+    df["col"] = df["place_id"].map(col)
+    # duplikat (user, place) → ambil yang terakhir, sama seperti upsert di app
+    df = df.sort_values("ts", kind="stable").drop_duplicates(["user_id", "col"], keep="last")
+
+    if mode == "temporal":
+        order = df.groupby("user_id")["ts"].rank(method="first", ascending=False)
+    elif mode == "loo":
+        rng = np.random.default_rng(seed)
+        df["_r"] = rng.random(len(df))
+        order = df.groupby("user_id")["_r"].rank(method="first")
+    else:
+        raise ValueError(f"split tidak dikenal: {mode!r} (loo | temporal)")
+    size = df.groupby("user_id")["col"].transform("size")
+    df = df[size > holdout]
+    is_test = order.loc[df.index] <= holdout
+
+    users = {u: i for i, u in enumerate(sorted(df["user_id"].unique()))}
+    row = df["user_id"].map(users).to_numpy()
+    shape = (len(users), len(item_ids))
+
+    def _mat(mask):
+        return csr_matrix((df["rating"].to_numpy(float)[mask], (row[mask], df["col"].to_numpy()[mask])),
+                          shape=shape)
+
+    return _mat(~is_test.to_numpy()), _mat(is_test.to_numpy())
+
+
+def train_engines(R_train: csr_matrix, names, als_kw: dict) -> dict:
+    engines = {}
+    for name in names:
+        if name == "itemsim":
+            engines[name] = ItemSimEngine.train(R_train)
+        elif name == "als":
+            engines[name] = ALSEngine.train(R_train, **als_kw)
+        else:
+            raise ValueError(f"engine tidak dikenal: {name!r} (itemsim | als)")
+    return engines
+
+
+# ---------- Metrik ----------
+def topk_metrics(s: np.ndarray, rel: np.ndarray, k: int):
+    """
+    s   : skor b × n (item seen sudah -inf)
+    rel : relevansi biner b × n
+    Return (top b × k, dict metrik per user: precision, recall, ndcg, hit).
+    """
+    k = min(k, s.shape[1])
+    top = np.argpartition(-s, kth=k - 1, axis=1)[:, :k]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(s, top, axis=1), axis=1), axis=1)
+    hits = np.take_along_axis(rel, top, axis=1).astype(float)
+    n_rel = rel.sum(axis=1)
+
+    disc = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = hits @ disc
+    idcg = np.concatenate([[0.0], np.cumsum(disc)])[np.minimum(n_rel, k)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m = {
+            "precision": hits.sum(axis=1) / k,
+            "recall": np.where(n_rel > 0, hits.sum(axis=1) / n_rel, 0.0),
+            "ndcg": np.where(idcg > 0, dcg / idcg, 0.0),
+            "hit": (hits.sum(axis=1) > 0).astype(float),
+        }
+    return top, m
+
+
+# ---------- Worker ----------
+_W = {}
+
+
+def _init_worker(cbf_dir, cf_dir, data_dir, engines, R_train, R_test, alphas, k, relevant):
+    # Pool fork: BLAS sudah terinisialisasi dari parent, env OMP_NUM_THREADS tidak
+    # berlaku lagi → batasi langsung lewat threadpoolctl, 1 thread BLAS per worker.
+    _W["blas_limit"] = threadpool_limits(limits=1)
+    _W.update(
+        svc=RecommenderService(cbf_dir=cbf_dir, cf_dir=cf_dir, fallback_data_dir=data_dir,
+                               similar_topn=0),
+        engines=engines, R_train=R_train, R_test=R_test,
+        alphas=alphas, k=k, relevant=relevant,
+    )
+
+
+def _eval_batch(engine: str, a: int, b: int):
+    """Skor mentah sekali untuk user [a, b), lalu metrik untuk semua alpha."""
+    svc, C, T = _W["svc"], _W["R_train"][a:b], _W["R_test"][a:b]
+    rel = (T.toarray() >= _W["relevant"])
+    keep = rel.any(axis=1)                                  # user tanpa item relevan di test tidak dihitung
+    C, rel = C[keep], rel[keep]
+    if C.shape[0] == 0:
+        return engine, {}
+
+    s_cf, s_cbf = svc.raw_scores_batch(C, cf=_W["engines"][engine])
+    n_cf, n_cbf = norm01(s_cf, axis=1), norm01(s_cbf, axis=1)
+    seen_r, seen_c = C.nonzero()
+
+    out = {}
+    for alpha in _W["alphas"]:
+        s = alpha * n_cf + (1 - alpha) * n_cbf
+        s[seen_r, seen_c] = -np.inf
+        top, m = topk_metrics(s, rel, _W["k"])
+        out[alpha] = ({key: (v.sum(), len(v)) for key, v in m.items()}, np.unique(top))
+    return engine, out
+
+
+# ---------- Sweep ----------
+def run_sweep(svc_dirs, df, item_ids, args):
+    R_train, R_test = split_ratings(df, item_ids, mode=args.split, holdout=args.holdout, seed=args.seed)
+    if R_train.shape[0] == 0:
+        raise SystemExit(f"Tidak ada user dengan lebih dari {args.holdout} rating untuk dievaluasi.")
+    engines_names = [e.strip() for e in args.engines.split(",") if e.strip()]
+    alphas = [float(a) for a in args.alphas.split(",") if a.strip()]
+    t0 = time.perf_counter()
+    engines = train_engines(R_train, engines_names, dict(
+        factors=args.factors, reg=args.reg, iters=args.iters, implicit=args.implicit))
+    t_train = time.perf_counter() - t0
+
+    n_users = R_train.shape[0]
+    batches = [(a, min(a + args.batch, n_users)) for a in range(0, n_users, args.batch)]
+    acc = {(e, al): {"sums": {}, "items": set()} for e in engines_names for al in alphas}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=args.jobs,
+        initializer=_init_worker,
+        initargs=(*svc_dirs, engines, R_train, R_test, alphas, args.k, args.relevant),
+    ) as pool:
+        futs = [pool.submit(_eval_batch, e, a, b) for e in engines_names for a, b in batches]
+        for f in futs:
+            engine, out = f.result()
+            for alpha, (sums, items) in out.items():
+                slot = acc[(engine, alpha)]
+                for key, (tot, n) in sums.items():
+                    s0, n0 = slot["sums"].get(key, (0.0, 0))
+                    slot["sums"][key] = (s0 + tot, n0 + n)
+                slot["items"].update(items.tolist())
+    t_score = time.perf_counter() - t0
+
+    rows = []
+    for (engine, alpha), slot in acc.items():
+        n_eval = slot["sums"].get("precision", (0, 0))[1]
+        row = {"engine": engine, "alpha": alpha, "users": n_eval}
+        for key in ("precision", "recall", "ndcg", "hit"):
+            tot, n = slot["sums"].get(key, (0.0, 0))
+            row[key] = tot / n if n else 0.0
+        row["coverage"] = len(slot["items"]) / len(item_ids) if item_ids else 0.0
+        rows.append(row)
+    res = pd.DataFrame(rows).sort_values(["ndcg", "recall"], ascending=False).reset_index(drop=True)
+    info = {
+        "train": R_train.shape, "train_nnz": R_train.nnz, "test_nnz": R_test.nnz,
+        "train_s": t_train, "score_s": t_score,
+    }
+    return res, info
+
+
+def write_report(path, res: pd.DataFrame, info: dict, args):
+    k = args.k
+    lines = [
+        "# Evaluasi offline rekomendasi hybrid",
+        "",
+        f"- split: `{args.split}` (holdout={args.holdout}, seed={args.seed}), relevan: rating ≥ {args.relevant}",
+        f"- users×items train: {info['train'][0]}×{info['train'][1]}, "
+        f"rating train={info['train_nnz']}, test={info['test_nnz']}",
+        f"- waktu: latih engine {info['train_s']:.2f}s, skor+metrik {info['score_s']:.2f}s "
+        f"({args.jobs or os.cpu_count()} proses)",
+        "",
+        f"| engine | alpha | users | P@{k} | R@{k} | NDCG@{k} | HR@{k} | coverage |",
+        "|---|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for r in res.itertuples():
+        lines.append(f"| {r.engine} | {r.alpha:.2f} | {r.users} | {r.precision:.4f} | {r.recall:.4f} "
+                     f"| {r.ndcg:.4f} | {r.hit:.4f} | {r.coverage:.3f} |")
+    best = res.iloc[0]
+    lines += ["", f"Terbaik (NDCG@{k}): engine `{best.engine}`, HYBRID_ALPHA={best.alpha:g}", ""]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def main():
+    base_dir = os.path.dirname(__file__)
+    ap = argparse.ArgumentParser(description="Evaluasi offline hybrid: sweep alpha × engine CF.")
+    ap.add_argument("--ratings", default=os.path.join(base_dir, "data", "eco_rating.csv"))
+    ap.add_argument("--database-url", default=None, help="pakai tabel ratings (created_at untuk split temporal)")
+    ap.add_argument("--split", choices=["loo", "temporal"], default="loo")
+    ap.add_argument("--holdout", type=int, default=1, help="jumlah rating test per user")
+    ap.add_argument("--relevant", type=float, default=4.0, help="rating test minimal agar dianggap relevan")
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--alphas", default="0,0.2,0.4,0.6,0.8,1")
+    ap.add_argument("--engines", default="itemsim,als")
+    ap.add_argument("--factors", type=int, default=int(os.environ.get("ALS_FACTORS", 32)))
+    ap.add_argument("--reg", type=float, default=float(os.environ.get("ALS_REG", 0.1)))
+    ap.add_argument("--iters", type=int, default=int(os.environ.get("ALS_ITERS", 15)))
+    ap.add_argument("--implicit", action="store_true")
+    ap.add_argument("--batch", type=int, default=256, help="user per batch skor")
+    ap.add_argument("--jobs", type=int, default=None, help="jumlah proses (default: semua core)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--report", default="eval_report.md")
+    args = ap.parse_args()
+
+    svc_dirs = (
+        os.environ.get("CBF_DIR", os.path.join(base_dir, "models", "cbf")),
+        os.environ.get("CF_DIR", os.path.join(base_dir, "models", "cf")),
+        os.path.join(base_dir, "data"),
+    )
+    # Ruang item mengikuti service (setelah _sanity_align_ids), sama dengan worker.
+    svc = RecommenderService(cbf_dir=svc_dirs[0], cf_dir=svc_dirs[1],
+                             fallback_data_dir=svc_dirs[2], similar_topn=0)
+    df = load_ratings_frame(None if args.database_url else args.ratings, args.database_url)
+
+    t0 = time.perf_counter()
+    res, info = run_sweep(svc_dirs, df, svc.item_ids, args)
+    print(res.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+    write_report(args.report, res, info, args)
+    print(f"[eval] {time.perf_counter() - t0:.1f}s → {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Write-behind untuk rating (opsional, RATINGS_WRITE_BEHIND=1).
+
+Alur per klik bintang:
+  submit() → tulis 1 baris JSON ke log append-only (durable) → masuk antrean
+           → overlay `pending` (read-your-writes untuk user yang sama) → selesai.
+Flusher (thread latar) tiap beberapa milidetik:
+  - ambil semua event di antrean, gabungkan per (user, place) (yang terakhir menang)
+  - satu batch UPSERT ke `ratings`
+  - satu query agregat GROUP BY place_id → bulk update places.rating_avg
+  - satu commit; log dikosongkan kalau sudah tidak ada event tertunda
+  - gagal karena DB sibuk (OperationalError) → event yang masih terbaru diantrekan ulang;
+    gagal lain (mis. FK) → batch diulang per baris, hanya baris yang gagal dibuang
+Saat start, isi log yang belum sempat di-flush diputar ulang (upsert idempoten).
+
+Multi-worker (gunicorn): RATINGS_WAL adalah nama dasar. Tiap proses mengunci (flock)
+slot log sendiri: ratings_wal.jsonl, ratings_wal.1.jsonl, ratings_wal.2.jsonl, ...
+Log slot yang tidak dikunci siapa pun (worker mati sebelum flush) diambil alih saat
+start: isinya dipindah ke log sendiri lalu diputar ulang.
+"""
+import glob
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import OperationalError
+
+try:  # flock hanya ada di POSIX; tanpa itu → satu log, satu proses
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .models import db, Place, Rating
+
+
+class RatingWriteBehind:
+    def __init__(self, app, log_path: str, flush_ms: int = 20, fsync: bool = True):
+        self.app = app
+        self.flush_s = max(int(flush_ms), 1) / 1000.0
+        self.fsync = bool(fsync)
+        self.on_flush = []                              # callback(place_ids) setelah commit
+        self._q: queue.Queue = queue.Queue()
+        self._pending: dict[tuple[int, int], float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self._log = self._claim_slot(log_path)
+        self.log_path = self._log.name
+        self._replay(self.log_path)
+        self._adopt_orphans(log_path)
+        self._thread = threading.Thread(target=self._run, name="rating-flusher", daemon=True)
+        self._thread.start()
+
+    # ---------- API ----------
+    def submit(self, uid: int, pid: int, rating: float):
+        """Catat event rating ke log + antrean; kembali segera tanpa menyentuh DB."""
+        ev = (int(uid), int(pid), float(rating))
+        line = json.dumps({"u": ev[0], "p": ev[1], "r": ev[2], "t": time.time()})
+        with self._lock:
+            self._log.write(line + "\n")
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._pending[(ev[0], ev[1])] = ev[2]
+            self._q.put(ev)
+
+    def pending_for(self, uid: int) -> dict[int, float]:
+        """Rating user yang belum di-flush ke DB: {place_id: rating}."""
+        uid = int(uid)
+        with self._lock:
+            return {p: r for (u, p), r in self._pending.items() if u == uid}
+
+    def pending_rating(self, uid: int, pid: int) -> float | None:
+        with self._lock:
+            return self._pending.get((int(uid), int(pid)))
+
+    def flush_now(self, timeout: float = 5.0):
+        """Tunggu sampai semua event tertunda masuk DB (untuk test / shutdown)."""
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            with self._lock:
+                if not self._pending:
+                    return True
+            time.sleep(self.flush_s)
+        return False
+
+    def close(self):
+        self.flush_now()
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._log.close()
+
+    # ---------- Log per proses ----------
+    @staticmethod
+    def _slot_path(base: str, n: int) -> str:
+        if n == 0:
+            return base
+        root, ext = os.path.splitext(base)
+        return f"{root}.{n}{ext}"
+
+    @staticmethod
+    def _try_lock(f) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _claim_slot(self, base: str):
+        """Buka & kunci slot log pertama yang bebas; dipegang sampai proses selesai."""
+        n = 0
+        while True:
+            f = open(self._slot_path(base, n), "a", encoding="utf-8")
+            if self._try_lock(f):
+                return f
+            f.close()
+            n += 1
+
+    def _slot_paths(self, base: str) -> list[str]:
+        root, ext = os.path.splitext(base)
+        pat = re.compile(re.escape(root) + r"\.\d+" + re.escape(ext) + "$")
+        return [base] + sorted(p for p in glob.glob(f"{glob.escape(root)}.*{ext}") if pat.match(p))
+
+    def _adopt_orphans(self, base: str):
+        """Log slot lain yang tidak dikunci (pemiliknya sudah mati) → pindah ke log sendiri."""
+        if fcntl is None:
+            return
+        for path in self._slot_paths(base):
+            if os.path.abspath(path) == os.path.abspath(self.log_path) or not os.path.exists(path):
+                continue
+            with open(path, "r+", encoding="utf-8") as f:
+                if not self._try_lock(f):
+                    continue                            # masih dipakai worker lain
+                events = list(self._read_events(f))
+                if events:
+                    with self._lock:
+                        for u, p, r in events:
+                            self._log.write(json.dumps({"u": u, "p": p, "r": r, "t": time.time()}) + "\n")
+                            self._pending[(u, p)] = r
+                            self._q.put((u, p, r))
+                        self._log.flush()
+                        os.fsync(self._log.fileno())    # sudah durable di log sendiri
+                f.truncate(0)
+
+    @staticmethod
+    def _read_events(f):
+        for line in f:
+            try:
+                d = json.loads(line)
+                yield int(d["u"]), int(d["p"]), float(d["r"])
+            except (ValueError, KeyError, TypeError):
+                continue  # baris terakhir bisa terpotong saat crash
+
+    def _replay(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            for ev in self._read_events(f):
+                self._pending[(ev[0], ev[1])] = ev[2]
+                self._q.put(ev)
+
+    # ---------- Flusher ----------
+    def _requeue(self, failed: dict[tuple[int, int], float]):
+        """
+        Antrekan ulang hanya event yang masih terbaru. Kalau user sudah memberi rating
+        baru selama batch ini diproses, event baru itu sudah ada di antrean; nilai lama
+        tidak boleh menyusul di belakangnya.
+        """
+        with self._lock:
+            for (u, p), r in failed.items():
+                if self._pending.get((u, p)) == r:
+                    self._q.put((u, p, r))
+
+    def _apply_rows(self, latest: dict[tuple[int, int], float]):
+        """Fallback per baris: satu rating tidak valid tidak ikut menggagalkan user lain."""
+        pids, retry = set(), {}
+        for key, r in latest.items():
+            try:
+                with self.app.app_context():
+                    pids.update(self._apply({key: r}))
+            except OperationalError:
+                retry[key] = r
+            except Exception:
+                self.app.logger.exception("[write-behind] rating dibuang: user=%s place=%s", *key)
+        return sorted(pids), retry
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            time.sleep(self.flush_s)                    # kumpulkan event lain jadi satu batch
+            batch = [first]
+            while True:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+
+            latest: dict[tuple[int, int], float] = {}
+            for u, p, r in batch:
+                latest[(u, p)] = r
+            retry = {}
+            try:
+                with self.app.app_context():
+                    pids = self._apply(latest)
+            except OperationalError as e:
+                # mis. "database is locked" → kembalikan ke antrean, coba lagi nanti
+                self.app.logger.warning("[write-behind] flush gagal, retry: %s", e)
+                self._requeue(latest)
+                time.sleep(self.flush_s * 5)
+                continue
+            except Exception:
+                # data tidak valid (mis. FK place) → ulang per baris, buang yang gagal saja
+                self.app.logger.warning("[write-behind] batch gagal, diulang per baris")
+                pids, retry = self._apply_rows(latest)
+                self._requeue(retry)
+
+            with self._lock:
+                for key, r in latest.items():
+                    if key not in retry and self._pending.get(key) == r:
+                        del self._pending[key]
+                if not self._pending and self._q.empty():
+                    self._log.truncate(0)               # semua sudah durable di DB
+                    self._log.seek(0)
+            for cb in self.on_flush:
+                cb(pids)
+
+    def _apply(self, latest: dict[tuple[int, int], float]) -> list[int]:
+        """Satu transaksi: batch upsert rating + update agregat per place yang tersentuh."""
+        rows = [{"user_id": u, "place_id": p, "rating": r} for (u, p), r in latest.items()]
+        dialect = db.engine.dialect.name
+        try:
+            if dialect in ("sqlite", "postgresql"):
+                if dialect == "sqlite":
+                    from sqlalchemy.dialects.sqlite import insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert
+                stmt = insert(Rating)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["user_id", "place_id"],
+                    set_={"rating": stmt.excluded.rating},
+                )
+                db.session.execute(stmt, rows)
+            else:
+                for d in rows:
+                    row = Rating.query.filter_by(user_id=d["user_id"], place_id=d["place_id"]).first()
+                    if row: row.rating = d["rating"]
+                    else:   db.session.add(Rating(**d))
+
+            pids = sorted({p for _, p in latest})
+            aggs = db.session.query(Rating.place_id, func.avg(Rating.rating))\
+                .join(Place, Place.id == Rating.place_id)\
+                .filter(Rating.place_id.in_(pids))\
+                .group_by(Rating.place_id).all()
+            upd = [{"id": int(pid), "rating_avg": float(avg or 0.0)} for pid, avg in aggs]
+            if upd:
+                db.session.execute(update(Place), upd)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+        return pids
@@ -0,0 +1,348 @@
+"""
+Load test end-to-end lewat HTTP: create_app() sungguhan + DB sementara + campuran trafik.
+
+  - Server: proses terpisah (spawn) → DB SQLite sementara (atau --database-url),
+    seed user & rating sintetis, lalu werkzeug threaded server di port acak.
+    Exception yang lolos dari handler (mis. "database is locked") dihitung lewat
+    sinyal got_request_exception dan dikirim balik saat selesai.
+  - Client: `--concurrency` thread, masing-masing satu user virtual (login di awal,
+    koneksi keep-alive sendiri), memilih operasi acak sesuai bobot `--mix`.
+  - Laporan: throughput, p50/p95/p99 & error rate per route, ringkasan exception server.
+
+Konfigurasi app tetap lewat env (RATINGS_WRITE_BEHIND, RECS_ACCUMULATORS, ...).
+Jalankan dari root repo:
+    python -m backend.loadtest --duration 30 --concurrency 16
+    python -m backend.loadtest --mix hybrid=50,rate=50 --max-error-rate 0.01
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from multiprocessing import get_context
+
+import numpy as np
+
+DEFAULT_MIX = "anon=15,list=10,detail=15,login=3,like=3,rate=15,hybrid=25,comment=5,bookmark=4,bookmarks=5"
+PASSWORD = "loadtest-pass"
+
+
+# ---------- Server (proses anak) ----------
+def _seed(db, n_users: int, ratings_per_user: int, seed: int):
+    """User sintetis (loadN@loadtest.local) + rating acak; hash password dipakai bersama."""
+    from sqlalchemy import insert
+    from .models import User, Place, Rating
+    from .utils import hash_password
+
+    rng = random.Random(seed)
+    emails = [f"load{i}@loadtest.local" for i in range(n_users)]
+    have = {e for (e,) in db.session.query(User.email).filter(User.email.in_(emails))}
+    pw = hash_password(PASSWORD)
+    rows = [{"name": f"Load {i}", "email": e, "password_hash": pw}
+            for i, e in enumerate(emails) if e not in have]
+    if rows:
+        db.session.execute(insert(User), rows)
+
+    uids = [u for (u,) in db.session.query(User.id).filter(User.email.in_(emails))]
+    pids = [p for (p,) in db.session.query(Place.id)]
+    rated = {(u, p) for u, p in db.session.query(Rating.user_id, Rating.place_id)
+             .filter(Rating.user_id.in_(uids))}
+    ratings = []
+    for u in uids:
+        for p in rng.sample(pids, min(ratings_per_user, len(pids))):
+            if (u, p) not in rated:
+                ratings.append({"user_id": u, "place_id": p, "rating": float(rng.randint(1, 5))})
+    if ratings:
+        db.session.execute(insert(Rating), ratings)
+    db.session.commit()
+    return emails, pids
+
+
+def _serve(conn, database_url: str, workdir: str, n_users: int, ratings_per_user: int, seed: int):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("RATINGS_WAL", os.path.join(workdir, "ratings_wal.jsonl"))
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    from flask import got_request_exception
+    from werkzeug.serving import make_server
+    from .app import create_app
+    from .models import db
+
+    app = create_app()
+    with app.app_context():
+        emails, pids = _seed(db, n_users, ratings_per_user, seed)
+
+    errors = Counter()
+    lock = threading.Lock()
+
+    def _on_exception(sender, exception, **extra):
+        msg = str(exception).strip().splitlines()[0] if str(exception).strip() else ""
+        with lock:
+            errors[f"{type(exception).__name__}: {msg[:120]}"] += 1
+
+    got_request_exception.connect(_on_exception, app, weak=False)
+
+    srv = make_server("127.0.0.1", 0, app, threaded=True)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    conn.send({"port": srv.server_port, "emails": emails, "pids": pids})
+
+    conn.recv()                                             # "stop"
+    srv.shutdown()
+    if getattr(app, "ratings_wb", None) is not None:
+        app.ratings_wb.close()
+    with lock:
+        conn.send(dict(errors))
+    conn.close()
+
+
+# ---------- Client ----------
+class _Client:
+    """Satu user virtual: koneksi keep-alive sendiri + token JWT."""
+
+    def __init__(self, port: int, email: str, pids: list[int], rng: random.Random):
+        self.port = port
+        self.email = email
+        self.pids = pids
+        self.rng = rng
+        self.token = None
+        self.http = None
+
+    def request(self, method: str, path: str, body=None):
+        headers = {"Accept-Encoding": "gzip"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            if self.http is None:
+                self.http = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            try:
+                self.http.request(method, path, body=data, headers=headers)
+                resp = self.http.getresponse()
+                payload = resp.read()
+                if resp.getheader("Connection", "").lower() == "close":
+                    self.http.close()
+                    self.http = None
+                return resp.status, payload
+            except (http.client.HTTPException, ConnectionError):
+                # koneksi keep-alive ditutup server → sambung ulang sekali
+                self.http.close()
+                self.http = None
+                if attempt:
+                    raise
+
+    # Satu operasi = satu request HTTP, supaya latensi per route bersih.
+    def op_anon(self):
+        return self.request("GET", "/api/recs/anonymous?k=20")
+
+    def op_list(self):
+        return self.request("GET", "/api/places?limit=50")
+
+    def op_detail(self):
+        return self.request("GET", f"/api/places/{self.rng.choice(self.pids)}")
+
+    def op_login(self):
+        st, payload = self.request("POST", "/api/auth/login",
+                                   {"email": self.email, "password": PASSWORD})
+        if st == 200:
+            self.token = json.loads(payload)["token"]
+        return st, payload
+
+    def op_like(self):
+        return self.request("POST", "/api/onboarding/like",
+                            {"place_ids": self.rng.sample(self.pids, 3)})
+
+    def op_rate(self):
+        return self.request("POST", "/api/ratings",
+                            {"place_id": self.rng.choice(self.pids), "rating": self.rng.randint(1, 5)})
+
+    def op_hybrid(self):
+        return self.request("GET", "/api/recs/hybrid?k=20")
+
+    def op_comment(self):
+        return self.request("POST", "/api/comments",
+                            {"place_id": self.rng.choice(self.pids), "text": "load test"})
+
+    def op_bookmark(self):
+        return self.request("POST", "/api/bookmarks", {"place_id": self.rng.choice(self.pids)})
+
+    def op_bookmarks(self):
+        return self.request("GET", "/api/bookmarks")
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, w = part.partition("=")
+        name = name.strip()
+        if not hasattr(_Client, f"op_{name}"):
+            raise SystemExit(f"Operasi tidak dikenal di --mix: {name}")
+        mix[name] = float(w or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise SystemExit("--mix kosong")
+    return mix
+
+
+def _worker(client: _Client, mix: dict[str, float], deadline: float, quota, results, lock):
+    names, weights = list(mix), list(mix.values())
+    local = []
+    ops = [("login", client.op_login)]                      # login dulu agar punya token
+    while True:
+        if time.monotonic() >= deadline or not quota():
+            break
+        if ops:
+            name, fn = ops.pop()
+        else:
+            name = client.rng.choices(names, weights)[0]
+            fn = getattr(client, f"op_{name}")
+        t0 = time.perf_counter()
+        try:
+            status, _ = fn()
+            err = None if status < 400 else f"HTTP {status}"
+        except Exception as e:  # timeout / koneksi putus dihitung sebagai error route
+            err = f"{type(e).__name__}: {e}"[:120]
+        local.append((name, time.perf_counter() - t0, err))
+    with lock:
+        results.extend(local)
+
+
+def summarize(results, elapsed: float) -> dict:
+    by_route = defaultdict(list)
+    errs = defaultdict(Counter)
+    for name, dt, err in results:
+        by_route[name].append(dt)
+        if err:
+            errs[name][err] += 1
+    routes = {}
+    for name, lat in sorted(by_route.items()):
+        ms = np.asarray(lat) * 1000
+        n_err = sum(errs[name].values())
+        routes[name] = {
+            "n": len(lat),
+            "rps": len(lat) / elapsed,
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "error_rate": n_err / len(lat),
+            "errors": dict(errs[name]),
+        }
+    n = len(results)
+    n_err = sum(1 for *_, e in results if e)
+    all_ms = np.asarray([dt for _, dt, _ in results]) * 1000 if results else np.zeros(1)
+    return {
+        "elapsed_s": elapsed,
+        "requests": n,
+        "rps": n / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(all_ms, 50)),
+        "p95_ms": float(np.percentile(all_ms, 95)),
+        "p99_ms": float(np.percentile(all_ms, 99)),
+        "error_rate": n_err / n if n else 0.0,
+        "routes": routes,
+    }
+
+
+def print_report(rep: dict):
+    print(f"requests={rep['requests']} elapsed={rep['elapsed_s']:.1f}s "
+          f"throughput={rep['rps']:.1f} req/s error_rate={rep['error_rate']:.2%}")
+    print(f"{'route':>10} {'n':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err%':>6}")
+    for name, r in rep["routes"].items():
+        print(f"{name:>10} {r['n']:>6} {r['rps']:>7.1f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['error_rate']:>6.1%}")
+    print(f"{'ALL':>10} {rep['requests']:>6} {rep['rps']:>7.1f} {rep['p50_ms']:>8.1f} "
+          f"{rep['p95_ms']:>8.1f} {rep['p99_ms']:>8.1f} {rep['error_rate']:>6.1%}")
+    for name, r in rep["routes"].items():
+        for msg, c in r["errors"].items():
+            print(f"  [{name}] {c}x {msg}")
+    if rep.get("server_exceptions"):
+        print("server exceptions:")
+        for msg, c in sorted(rep["server_exceptions"].items(), key=lambda x: -x[1]):
+            print(f"  {c}x {msg}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load test HTTP end-to-end dengan campuran trafik.")
+    ap.add_argument("--mix", default=DEFAULT_MIX,
+                    help="bobot operasi: anon,list,detail,login,like,rate,hybrid,comment,bookmark,bookmarks")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=20.0, help="detik")
+    ap.add_argument("--requests", type=int, default=0, help="berhenti setelah N request (0 = pakai durasi)")
+    ap.add_argument("--users", type=int, default=50)
+    ap.add_argument("--ratings-per-user", type=int, default=15)
+    ap.add_argument("--database-url", default=None, help="default: SQLite sementara")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", default=None, help="simpan ringkasan ke file JSON")
+    ap.add_argument("--max-error-rate", type=float, default=None,
+                    help="exit code 1 kalau error rate total melebihi nilai ini")
+    args = ap.parse_args()
+    mix = parse_mix(args.mix)
+
+    workdir = tempfile.mkdtemp(prefix="eco-loadtest-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    ctx = get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=_serve, args=(child, database_url, workdir, args.users,
+                                           args.ratings_per_user, args.seed))
+    proc.start()
+    try:
+        info = parent.recv()
+        print(f"server 127.0.0.1:{info['port']} db={database_url} users={len(info['emails'])} "
+              f"concurrency={args.concurrency} mix={args.mix}")
+
+        results, lock = [], threading.Lock()
+        issued = [0]
+
+        def quota():
+            if args.requests <= 0:
+                return True
+            with lock:
+                issued[0] += 1
+                return issued[0] <= args.requests
+
+        rng = random.Random(args.seed)
+        clients = [
+            _Client(info["port"], info["emails"][i % len(info["emails"])], info["pids"],
+                    random.Random(rng.random()))
+            for i in range(args.concurrency)
+        ]
+        deadline = time.monotonic() + (args.duration if args.requests <= 0 else 1e9)
+        threads = [threading.Thread(target=_worker, args=(c, mix, deadline, quota, results, lock))
+                   for c in clients]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        parent.send("stop")
+        server_exc = parent.recv()
+    finally:
+        proc.join(timeout=30)
+        if proc.is_alive():
+            proc.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rep = summarize(results, elapsed)
+    rep["server_exceptions"] = server_exc
+    rep["config"] = {"mix": mix, "concurrency": args.concurrency, "database_url": database_url}
+    print_report(rep)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+    if args.max_error_rate is not None and rep["error_rate"] > args.max_error_rate:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Engine skor Collaborative Filtering yang bisa dipilih lewat config (CF_ENGINE):
+  - ItemSimEngine : matriks similarity item-item n×n (artefak cf_item_sim.npy)
+  - ALSEngine     : matrix factorization ALS (explicit / implicit), hanya simpan
+                    faktor user (m×d) & item (n×d) → memori O((m+n)·d), bukan O(n²)
+
+Keduanya punya antarmuka yang sama untuk RecommenderService:
+  score(cols, vals, cand)  → skor CF user (preferensi sparse ruang CF) di kolom `cand`
+  score_batch(C, cand)     → versi batch, C = CSR (b × n) rating beberapa user
+  subset(idx)              → engine untuk item `idx` saja (sinkron dgn _sanity_align_ids)
+
+Training & perbandingan dari CLI:
+    python -m backend.mf train   --factors 32 --iters 15 [--implicit]
+    python -m backend.mf compare
+    python -m backend.mf bench   --users 200000 --items 50000 --jobs-list 1,2,4,8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import csr_matrix, load_npz
+
+
+# ---------- Engine: item-item similarity ----------
+class ItemSimEngine:
+    """Skor CF = item_sim · v (v = vektor rating user); fold-in rating baru bersifat linear."""
+
+    name = "itemsim"
+    supports_deltas = True
+
+    def __init__(self, item_sim: np.ndarray):
+        self.item_sim = item_sim
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.item_sim.nbytes)
+
+    def score(self, cols: np.ndarray, vals: np.ndarray, cand=None) -> np.ndarray:
+        sim = self.item_sim[:, cols] if cand is None else self.item_sim[np.ix_(cand, cols)]
+        return sim @ vals
+
+    def score_batch(self, C: csr_matrix, cand=None) -> np.ndarray:
+        sim = self.item_sim if cand is None else self.item_sim[cand]
+        return np.asarray(C @ sim.T)
+
+    def column(self, j: int) -> np.ndarray:
+        """Kontribusi 1 unit rating di item j ke skor semua item (untuk akumulator)."""
+        return self.item_sim[:, j]
+
+    def subset(self, idx: np.ndarray) -> "ItemSimEngine":
+        return ItemSimEngine(self.item_sim[np.ix_(idx, idx)])
+
+    @classmethod
+    def train(cls, R: csr_matrix) -> "ItemSimEngine":
+        """Cosine antar kolom R (user × item), diagonal 0 — resep yang sama dengan cf_item_sim.npy."""
+        from sklearn.preprocessing import normalize
+        Rn = normalize(R.tocsc().astype(float), norm="l2", axis=0)
+        sim = (Rn.T @ Rn).toarray()
+        np.fill_diagonal(sim, 0.0)
+        return cls(sim)
+
+
+# ---------- Engine: ALS matrix factorization ----------
+class ALSEngine:
+    """
+    ALS dengan faktor user U (m×d) & item Y (n×d).
+      - explicit : minimasi Σ (r_ui − u·y)² + λ(|u|² + |y|²) pada rating yang ada
+      - implicit : Hu-Koren-Volinsky, confidence c = 1 + conf_alpha·r, preferensi p = [r > 0]
+    User yang belum ada di U (semua user aplikasi) → fold-in closed-form dari rating-nya.
+    """
+
+    name = "als"
+    supports_deltas = False  # fold-in tidak linear terhadap himpunan item yang dirating
+
+    def __init__(self, user_factors: np.ndarray, item_factors: np.ndarray,
+                 reg: float = 0.1, implicit: bool = False, conf_alpha: float = 40.0):
+        self.user_factors = np.asarray(user_factors, dtype=np.float32)
+        self.item_factors = np.asarray(item_factors, dtype=np.float32)
+        self.reg = float(reg)
+        self.implicit = bool(implicit)
+        self.conf_alpha = float(conf_alpha)
+        Y = self.item_factors.astype(float)
+        self._YtY = Y.T @ Y  # dipakai fold-in implicit
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.user_factors.nbytes + self.item_factors.nbytes)
+
+    def fold_in(self, cols: np.ndarray, vals: np.ndarray) -> np.ndarray:
+        """Vektor faktor user baru dari rating-nya (satu langkah ALS dengan Y tetap)."""
+        d = self.item_factors.shape[1]
+        if len(cols) == 0:
+            return np.zeros(d)
+        Yi = self.item_factors[cols].astype(float)
+        A, b = _normal_eq(Yi, np.asarray(vals, dtype=float), self.reg,
+                          self.implicit, self.conf_alpha, self._YtY)
+        return np.linalg.solve(A, b)
+
+    def score(self, cols: np.ndarray, vals: np.ndarray, cand=None) -> np.ndarray:
+        Y = self.item_factors if cand is None else self.item_factors[cand]
+        return Y @ self.fold_in(cols, vals)
+
+    def score_known(self, user_row: int, cand=None) -> np.ndarray:
+        """User yang ikut training: cukup produk d×n dengan faktor yang tersimpan."""
+        Y = self.item_factors if cand is None else self.item_factors[cand]
+        return Y @ self.user_factors[user_row]
+
+    def score_batch(self, C: csr_matrix, cand=None) -> np.ndarray:
+        U = _solve_side(C, self.item_factors.astype(float), self.reg,
+                        self.implicit, self.conf_alpha)
+        Y = self.item_factors if cand is None else self.item_factors[cand]
+        return U @ Y.T
+
+    def subset(self, idx: np.ndarray) -> "ALSEngine":
+        return ALSEngine(self.user_factors, self.item_factors[idx],
+                         self.reg, self.implicit, self.conf_alpha)
+
+    # ---------- Persistensi ----------
+    def save(self, path):
+        np.savez_compressed(
+            path, user_factors=self.user_factors, item_factors=self.item_factors,
+            reg=self.reg, implicit=self.implicit, conf_alpha=self.conf_alpha,
+        )
+
+    @classmethod
+    def load(cls, path) -> "ALSEngine":
+        z = np.load(path)
+        return cls(z["user_factors"], z["item_factors"], float(z["reg"]),
+                   bool(z["implicit"]), float(z["conf_alpha"]))
+
+    @classmethod
+    def train(cls, R: csr_matrix, factors=32, reg=0.1, iters=15, implicit=False,
+              conf_alpha=40.0, n_jobs=None, seed=42) -> "ALSEngine":
+        U, Y = train_als(R, factors=factors, reg=reg, iters=iters, implicit=implicit,
+                         conf_alpha=conf_alpha, n_jobs=n_jobs, seed=seed)
+        return cls(U, Y, reg, implicit, conf_alpha)
+
+
+# ---------- Solver ALS ----------
+def _solve_side(R: csr_matrix, Y: np.ndarray, reg, implicit, conf_alpha,
+                pool: ThreadPoolExecutor | None = None, chunk: int = 2048,
+                max_cells: int = 1 << 22) -> np.ndarray:
+    """
+    Satu setengah-langkah ALS: faktor baru tiap baris R dengan Y tetap.
+    Baris diurutkan menurut jumlah rating lalu dipecah per blok (≤ chunk baris,
+    ≤ max_cells sel padding). Tiap blok: item tiap baris di-pad ke (b×L×d), persamaan
+    normal A = Yᵀ·C·Y + reg·I dan rhs disusun dengan matmul batch, lalu satu
+    np.linalg.solve batch — semuanya di numpy/BLAS yang melepas GIL, jadi blok
+    benar-benar jalan paralel di thread pool.
+    """
+    m, d = R.shape[0], Y.shape[1]
+    base = reg * np.eye(d) + (Y.T @ Y if implicit else 0.0)
+    X = np.zeros((m, d))
+    lens = np.diff(R.indptr)
+    order = np.argsort(lens, kind="stable")        # baris sepanjang mirip → padding kecil
+
+    def _block(a, b):
+        rows = order[a:b]
+        n_len = lens[rows]
+        L = int(n_len[-1])
+        if L == 0:                                  # tidak ada rating → A = reg·I, rhs = 0
+            return
+        pos = np.arange(L)
+        mask = pos[None, :] < n_len[:, None]
+        at = np.where(mask, R.indptr[rows][:, None] + pos[None, :], 0)
+        r = np.where(mask, R.data[at], 0.0)
+        Yp = Y[R.indices[at]] * mask[..., None]     # (b, L, d), slot padding = 0
+        YpT = Yp.transpose(0, 2, 1)
+        if implicit:
+            c = conf_alpha * r                      # c − 1
+            A = base + (YpT * c[:, None, :]) @ Yp
+            rhs = YpT @ (1.0 + c)[..., None]        # p = 1 untuk item yang dirating
+        else:
+            A = base + YpT @ Yp
+            rhs = YpT @ r[..., None]
+        X[rows] = np.linalg.solve(A, rhs)[..., 0]
+
+    blocks, a = [], 0
+    while a < m:
+        b = min(a + chunk, m)
+        L = max(int(lens[order[b - 1]]), 1)
+        b = min(b, a + max(1, max_cells // (L * d)))
+        blocks.append((a, b))
+        a = b
+    if pool is None or len(blocks) == 1:
+        for a, b in blocks:
+            _block(a, b)
+    else:
+        list(pool.map(lambda ab: _block(*ab), blocks))
+    return X
+
+
+def train_als(R: csr_matrix, factors=32, reg=0.1, iters=15, implicit=False,
+              conf_alpha=40.0, n_jobs=None, seed=42):
+    """Latih ALS pada R (user × item, CSR). Return (U, Y) float32."""
+    R = R.tocsr().astype(float)
+    Rt = R.T.tocsr()
+    rng = np.random.default_rng(seed)
+    U = rng.normal(scale=0.1, size=(R.shape[0], factors))
+    Y = rng.normal(scale=0.1, size=(R.shape[1], factors))
+    n_jobs = n_jobs or os.cpu_count() or 1
+    chunk = max(64, -(-max(R.shape) // (n_jobs * 4)))
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        for _ in range(iters):
+            U = _solve_side(R, Y, reg, implicit, conf_alpha, pool, chunk)
+            Y = _solve_side(Rt, U, reg, implicit, conf_alpha, pool, chunk)
+    return U.astype(np.float32), Y.astype(np.float32)
+
+
+def load_ratings_matrix(cf_dir, ratings_csv=None, database_url=None):
+    """
+    Matriks user × item (kolom = urutan item_ids artefak CF) dari salah satu sumber:
+    tabel `ratings` (database_url), CSV rating (user_id, place_id, user_rating), atau ui_matrix_csr.npz.
+    """
+    import joblib
+    import pandas as pd
+
+    cf_dir = Path(cf_dir)
+    if not (database_url or ratings_csv):
+        return load_npz(cf_dir / "ui_matrix_csr.npz").tocsr()
+
+    item_ids = list(joblib.load(cf_dir / "cf_artifacts.joblib").get("item_ids", []))
+    col = {pid: j for j, pid in enumerate(item_ids)}
+    if database_url:
+        from sqlalchemy import create_engine
+        df = pd.read_sql("SELECT user_id, place_id, rating FROM ratings", create_engine(database_url))
+    else:
+        df = pd.read_csv(ratings_csv).rename(columns={"user_rating": "rating"})
+    df = df[df["place_id"].isin(col)]
+    users = {u: i for i, u in enumerate(sorted(df["user_id"].unique()))}
+    return csr_matrix(
+        (df["rating"].astype(float), (df["user_id"].map(users), df["place_id"].map(col))),
+        shape=(len(users), len(item_ids)),
+    )
+
+
+# ---------- CLI ----------
+def main():
+    base_dir = os.path.dirname(__file__)
+    ap = argparse.ArgumentParser(description="Latih / bandingkan engine CF ALS.")
+    ap.add_argument("cmd", choices=["train", "compare", "bench"])
+    ap.add_argument("--cf-dir", default=os.environ.get("CF_DIR", os.path.join(base_dir, "models", "cf")))
+    ap.add_argument("--ratings-csv", default=None, help="mis. backend/data/eco_rating.csv")
+    ap.add_argument("--database-url", default=None, help="ambil dari tabel ratings")
+    ap.add_argument("--factors", type=int, default=int(os.environ.get("ALS_FACTORS", 32)))
+    ap.add_argument("--reg", type=float, default=float(os.environ.get("ALS_REG", 0.1)))
+    ap.add_argument("--iters", type=int, default=int(os.environ.get("ALS_ITERS", 15)))
+    ap.add_argument("--implicit", action="store_true")
+    ap.add_argument("--conf-alpha", type=float, default=40.0)
+    ap.add_argument("--jobs", type=int, default=None)
+    ap.add_argument("--users", type=int, default=100_000, help="bench: ukuran R sintetis")
+    ap.add_argument("--items", type=int, default=20_000)
+    ap.add_argument("--nnz-per-user", type=int, default=30)
+    ap.add_argument("--jobs-list", default="1,2,4", help="bench: daftar n_jobs, pisah koma")
+    args = ap.parse_args()
+
+    cf_dir = Path(args.cf_dir)
+    out = cf_dir / "als_factors.npz"
+    if args.cmd == "train":
+        R = load_ratings_matrix(cf_dir, args.ratings_csv, args.database_url)
+        t0 = time.perf_counter()
+        eng = ALSEngine.train(R, factors=args.factors, reg=args.reg, iters=args.iters,
+                              implicit=args.implicit, conf_alpha=args.conf_alpha, n_jobs=args.jobs)
+        eng.save(out)
+        print(f"[als] R={R.shape} nnz={R.nnz} → {out} ({time.perf_counter() - t0:.2f}s)")
+        return
+
+    if args.cmd == "bench":
+        # Waktu training vs n_jobs di R sintetis (skala thread pool antar core).
+        rng = np.random.default_rng(0)
+        m, n, z = args.users, args.items, args.nnz_per_user
+        R = csr_matrix(
+            (rng.integers(1, 6, m * z).astype(float), rng.integers(0, n, m * z), np.arange(0, m * z + 1, z)),
+            shape=(m, n),
+        )
+        R.sum_duplicates()
+        print(f"R={R.shape} nnz={R.nnz} factors={args.factors} iters={args.iters} cores={os.cpu_count()}")
+        print(f"{'jobs':>5} {'s':>8} {'speedup':>8}")
+        base = None
+        for j in [int(x) for x in args.jobs_list.split(",") if x.strip()]:
+            t0 = time.perf_counter()
+            train_als(R, factors=args.factors, reg=args.reg, iters=args.iters,
+                      implicit=args.implicit, conf_alpha=args.conf_alpha, n_jobs=j)
+            sec = time.perf_counter() - t0
+            base = base or sec
+            print(f"{j:>5} {sec:>8.2f} {base / sec:>8.2f}")
+        return
+
+    # compare: memori & latensi skor satu user untuk kedua engine
+    sim = ItemSimEngine(np.load(cf_dir / "cf_item_sim.npy"))
+    als = ALSEngine.load(out)
+    R = load_npz(cf_dir / "ui_matrix_csr.npz").tocsr()
+    users = [(R.indices[R.indptr[i]:R.indptr[i + 1]], R.data[R.indptr[i]:R.indptr[i + 1]])
+             for i in range(R.shape[0]) if R.indptr[i + 1] > R.indptr[i]]
+    print(f"{'engine':>8} {'MB':>9} {'ms/user':>8}")
+    for eng in (sim, als):
+        t0 = time.perf_counter()
+        for cols, vals in users:
+            eng.score(cols, vals)
+        ms = (time.perf_counter() - t0) / max(len(users), 1) * 1000
+        print(f"{eng.name:>8} {eng.nbytes / 2**20:>9.3f} {ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,8 @@ class Rating(db.Model):
     __tablename__ = "ratings"
     __table_args__ = (
         db.UniqueConstraint("user_id", "place_id", name="uq_rating_user_place"),
+        # covering index: preferensi user (place_id, rating) cukup dibaca dari index
+        db.Index("ix_ratings_user_place_rating", "user_id", "place_id", "rating"),
     )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
@@ -56,3 +58,23 @@ class Bookmark(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     place_id = db.Column(db.Integer, db.ForeignKey("places.id"), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Event(db.Model):
+    __tablename__ = "events"
+    __table_args__ = (
+        # "upcoming" & jendela tanggal → range scan di end_date / start_date;
+        # event per kota (dan per place lewat places.city) → range scan (lower(city), end_date),
+        # kota dicocokkan tanpa peduli huruf besar/kecil
+        db.Index("ix_events_start_date", "start_date"),
+        db.Index("ix_events_end_date", "end_date"),
+        db.Index("ix_events_city_ci_end", db.text("lower(city)"), "end_date"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    event_name = db.Column(db.String(255), nullable=False)
+    event_place = db.Column(db.String(255), default="")
+    event_about = db.Column(db.Text, default="")
+    event_date = db.Column(db.String(120), default="")  # teks asli, mis. "5 - 7 Agustus 2022"
+    start_date = db.Column(db.Date, nullable=True)       # hasil parse event_date saat seed
+    end_date = db.Column(db.Date, nullable=True)
+    city = db.Column(db.String(120), default="")         # disamakan dengan places.city bila cocok
+    image = db.Column(db.String(500), default="")
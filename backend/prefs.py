@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .models import db, Rating
+
+
+class UserPrefStore:
+    """
+    Ambil preferensi user untuk scorer hybrid secara ringan:
+      - query kolom saja (place_id, rating) → terlayani covering index
+        ix_ratings_user_place_rating, tanpa hydrate objek ORM Rating
+      - langsung jadi array (kolom CF, rating) lewat RecommenderService.pids_to_cf
+      - opsional memo per user (LRU, max_users > 0); wajib invalidate(uid) setelah
+        rating user berubah. invalidate() hanya berlaku di proses ini, jadi `ttl`
+        (detik, > 0) membatasi umur entri supaya rating yang masuk lewat worker lain
+        tetap terlihat; ttl <= 0 hanya aman untuk deployment satu proses.
+      - `pending` (RatingWriteBehind, opsional): rating yang belum di-flush ikut
+        digabung → read-your-writes untuk user yang sama
+    """
+
+    def __init__(self, recs, max_users: int = 0, pending=None, ttl: float = 0):
+        self.recs = recs
+        self.max_users = int(max_users)
+        self.pending = pending
+        self.ttl = float(ttl)
+        self._memo: OrderedDict[int, tuple[float, tuple[np.ndarray, np.ndarray]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid: int):
+        """Return (cols, vals) ruang CF untuk user `uid` (array kosong kalau belum ada rating)."""
+        uid = int(uid)
+        if self.max_users > 0:
+            with self._lock:
+                hit = self._memo.get(uid)
+                if hit is not None:
+                    if self.ttl <= 0 or (time.monotonic() - hit[0]) < self.ttl:
+                        self._memo.move_to_end(uid)
+                        return hit[1]
+                    del self._memo[uid]
+
+        rows = db.session.execute(
+            db.select(Rating.place_id, Rating.rating).where(Rating.user_id == uid)
+        ).all()
+        if self.pending is not None:
+            over = self.pending.pending_for(uid)
+            if over:
+                merged = {int(p): float(r) for p, r in rows}
+                merged.update(over)
+                rows = list(merged.items())
+        if rows:
+            arr = np.asarray(rows, dtype=float)
+            pref = self.recs.pids_to_cf(arr[:, 0].astype(np.int64), arr[:, 1])
+        else:
+            pref = (np.empty(0, dtype=np.int64), np.empty(0, dtype=float))
+
+        if self.max_users > 0:
+            with self._lock:
+                self._memo[uid] = (time.monotonic(), pref)
+                self._memo.move_to_end(uid)
+                while len(self._memo) > self.max_users:
+                    self._memo.popitem(last=False)
+        return pref
+
+    def get_map(self, uid: int) -> dict[int, float]:
+        """Preferensi user sebagai {place_id: rating} (hanya item di ruang CF)."""
+        cols, vals = self.get(uid)
+        ids = self.recs.item_ids
+        return {int(ids[j]): float(v) for j, v in zip(cols, vals)}
+
+    def invalidate(self, uid: int):
+        with self._lock:
+            self._memo.pop(int(uid), None)
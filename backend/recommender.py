@@ -1,11 +1,16 @@
 import os
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 import joblib
 from pathlib import Path
 
-from scipy.sparse import load_npz
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import load_npz, csr_matrix
+from sklearn.preprocessing import normalize
+
+from .mf import ItemSimEngine, ALSEngine
 
 import warnings
 try:
@@ -16,6 +21,27 @@ except Exception:
         pass
 
 
+def norm01(x: np.ndarray, axis=None) -> np.ndarray:
+    """
+    Bawa skor ke 0..1 (min-max) agar skala CF & CBF adil saat digabung.
+    axis=1 → normalisasi per baris (dipakai saat membangun tabel tetangga).
+    """
+    mn = np.nanmin(x, axis=axis, keepdims=axis is not None)
+    mx = np.nanmax(x, axis=axis, keepdims=axis is not None)
+    return scale01(x, mn, mx)
+
+
+def scale01(x: np.ndarray, mn, mx) -> np.ndarray:
+    """Min-max dengan min/max yang sudah diketahui (mis. gabungan statistik antar shard)."""
+    flat = ~np.isfinite(mn) | ~np.isfinite(mx) | (mx - mn < 1e-9)
+    out = (x - mn) / (mx - mn + 1e-9)
+    return np.where(flat, 0.0, out)
+
+
+SIMILAR_FILE = "similar_topn.npz"
+META_COLS = ["place_name", "city", "category", "price", "rating", "image"]  # metadata kartu UI
+
+
 class RecommenderService:
     """
     Service rekomendasi yang HANYA LOAD artefak (tidak training).
@@ -24,29 +50,91 @@ class RecommenderService:
           * cbf_item_matrix.npz       → matriks fitur item (teks TF-IDF + numerik scaled)
           * cbf_artifacts.joblib      → { tfidf, scaler, num_cols, place_id_order }
           * places_clean.csv (opsi)   → metadata tempat yang sudah diselaraskan
+          * (dibangun saat load) inverted index teks: term → postings (baris, bobot TF-IDF)
       - CF (di cf_dir):
           * cf_item_sim.npy           → matriks similarity item-item (berbasis rating)
           * cf_artifacts.joblib       → { item_ids, item_to_col }
+          * ui_matrix_csr.npz (opsi)  → matriks user×item (popularitas kandidat)
+          * als_factors.npz (opsi)    → faktor user/item ALS, dipakai kalau cf_engine="als"
+                                        (dilatih lewat `python -m backend.mf train`)
+      - Tabel tetangga "tempat serupa" (urutan CF):
+          * similar_ids / similar_scores → top-N per item (int32 / float32)
+          * similar_topn.npz (opsi, di cf_dir) → tabel hasil build offline
+                                        (`python -m backend.build_similar`); tanpa artefak,
+                                        dibangun saat load hanya untuk katalog ≤ similar_build_max
+      - Facet filter (dibangun saat load, urutan CF):
+          * bitmap per kota & per token kategori, index harga terurut (price_num)
     """
 
-    def __init__(self, cbf_dir: str, cf_dir: str, fallback_data_dir: str | None = None):
+    def __init__(self, cbf_dir: str, cf_dir: str, fallback_data_dir: str | None = None,
+                 hybrid_alpha: float = 0.6, similar_topn: int = 20,
+                 candidate_budget: int = 0, candidate_neighbors: int = 10,
+                 candidate_popular: int = 50, accumulator_size: int = 0,
+                 cf_engine: str = "itemsim", n_shards: int = 1, shard_lanes: int = 1,
+                 shard_timeout: float = 10.0, similar_build_max: int = 20000):
         self.cbf_dir = Path(cbf_dir)
         self.cf_dir = Path(cf_dir)
         self.fallback_data_dir = Path(fallback_data_dir) if fallback_data_dir else None
+        self.hybrid_alpha = float(hybrid_alpha)
+        self.cf_engine = (cf_engine or "itemsim").strip().lower()
+        self.similar_topn = int(similar_topn)
+        self.similar_build_max = int(similar_build_max)
+        # Two-stage: 0 = skor penuh; >0 = maksimal kandidat yang diskor exact.
+        self.candidate_budget = int(candidate_budget)
+        self.candidate_neighbors = int(candidate_neighbors)
+        self.candidate_popular = int(candidate_popular)
+        # Akumulator skor mentah per user (0 = nonaktif), lihat apply_rating_deltas.
+        self.accumulator_size = int(accumulator_size)
+        self._acc: OrderedDict[int, dict] = OrderedDict()
+        self._acc_lock = threading.Lock()
 
         # Data & artefak yang diload
         self.places_df: pd.DataFrame | None = None   # metadata item untuk kirim ke UI
+        self._meta: pd.DataFrame | None = None       # metadata UI ber-index id (reindex O(k) per request)
         self.place_id_order: list[int] = []          # urutan baris CBF (mapping id → row)
         self.X = None                                # matriks CBF (sparse)
         self.tfidf = None
         self.scaler = None
         self.num_cols: list[str] = []
 
-        self.item_sim = None       # matriks similarity CF (ndarray)
+        # Inverted index teks (bagian TF-IDF dari X) untuk pencarian bebas.
+        self._analyzer = None                        # tokenizer + n-gram sama persis dgn tfidf
+        self._idf = None                             # vektor idf per term
+        self._post_ptr = None                        # term t → postings [ptr[t], ptr[t+1])
+        self._post_rows = None                       # baris CBF pada postings
+        self._post_w = None                          # bobot TF-IDF pada postings
+
+        self.item_sim = None       # matriks similarity CF (ndarray, hanya engine itemsim)
+        self.cf = None             # engine skor CF (ItemSimEngine / ALSEngine)
+        self.sharded = None        # ShardedScorer (n_shards > 1): skor penuh paralel antar proses
         self.item_ids: list[int] = []                # urutan kolom CF
         self.item_to_col: dict[int, int] = {}        # mapping place_id → index kolom CF
+        self.ui = None                               # matriks user×item rating (CSR, opsional)
+        self._popular_cols = None                    # kolom CF urut paling banyak dirating
+        self._col_of_pid = np.empty(0, dtype=np.int64)  # lookup place_id → kolom CF (-1 = tidak ada)
+
+        # CBF yang disejajarkan ke urutan CF (untuk skor per kolom CF tanpa dict lookup).
+        self._cbf_row_of_col = None                  # kolom CF → baris CBF (-1 kalau tidak ada)
+        self._Xcf = None                             # baris X ternormalisasi L2, urutan CF
+
+        # Tabel tetangga: baris = kolom CF, isi = kolom CF tetangga & skor blend.
+        self.similar_ids = None
+        self.similar_scores = None
+
+        # Facet: bitmap bool sepanjang kolom CF + urutan harga untuk filter budget.
+        self._facet_city: dict[str, np.ndarray] = {}
+        self._facet_category: dict[str, np.ndarray] = {}
+        self._price_order = None                     # argsort price_num (kolom CF)
+        self._price_sorted = None                    # price_num terurut naik
 
         self._load_all()  # langsung load semua saat service dibuat
+        if int(n_shards) > 1 and self.cf is not None and self._Xcf is not None:
+            from .sharding import ShardedScorer, ShardError
+            try:
+                self.sharded = ShardedScorer(self.cf, self._Xcf, n_shards=int(n_shards),
+                                             lanes=int(shard_lanes), timeout=float(shard_timeout))
+            except ShardError as e:
+                warnings.warn(f"Worker shard gagal start, skor dihitung di satu proses: {e}")
 
     # ---------- Public APIs ----------
     def top_rated(self, k=20):
@@ -59,91 +147,366 @@ class RecommenderService:
         df = self.places_df.sample(n=min(n, len(self.places_df)), random_state=seed)
         return df[["id", "place_name", "city", "category", "price", "rating", "image"]]
 
-    def recommend_hybrid_for_user(self, user_ratings: dict, k=20, alpha=0.6):
+    def search_text(self, query: str, k=20):
+        """
+        Cari tempat dari teks bebas (mis. "air terjun trekking Bali").
+          - Query diubah ke vektor TF-IDF dengan vocabulary & idf artefak.
+          - Skor = dot product query dengan bagian teks X, tapi hanya lewat
+            postings term query (inverted index), tidak menyapu semua baris.
+        Return DataFrame metadata + kolom search_score (urut menurun).
+        """
+        cols = ["id", "place_name", "city", "category", "price", "rating", "image"]
+        empty = pd.DataFrame(columns=cols + ["search_score"])
+        if self._post_ptr is None or not (query or "").strip():
+            return empty
+
+        # --- Vektor query (tf * idf, lalu normalisasi L2 seperti TfidfVectorizer) ---
+        vocab = self.tfidf.vocabulary_
+        term_ids = [vocab[t] for t in self._analyzer(query) if t in vocab]
+        if not term_ids:
+            return empty
+        terms, tf = np.unique(np.asarray(term_ids, dtype=np.int64), return_counts=True)
+        tf = tf.astype(float)
+        if getattr(self.tfidf, "sublinear_tf", False):
+            tf = 1.0 + np.log(tf)
+        w = tf * self._idf[terms] if self._idf is not None else tf
+        w = w / (np.linalg.norm(w) or 1.0)
+
+        # --- Akumulasi skor dari postings term query saja ---
+        starts, ends = self._post_ptr[terms], self._post_ptr[terms + 1]
+        rows = np.concatenate([self._post_rows[a:b] for a, b in zip(starts, ends)])
+        if rows.size == 0:
+            return empty
+        vals = np.concatenate([self._post_w[a:b] * wq for a, b, wq in zip(starts, ends, w)])
+        cand, inv = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inv, weights=vals)
+
+        # Top-K dari kandidat yang tersentuh.
+        k = max(0, min(int(k), len(cand)))
+        if k == 0:
+            return empty
+        top = np.argpartition(-scores, kth=k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        top_pids = [self.place_id_order[i] for i in cand[top]]
+        meta = self._meta.reindex(top_pids).reset_index()
+        meta["search_score"] = np.round(scores[top], 4)
+        return meta
+
+    def seed_ratings_from_query(self, query: str, n=10):
+        """
+        Bibit preferensi untuk user baru (belum ada rating): hasil search_text
+        diubah jadi rating semu 1..5 sebanding skor, siap dipakai recommend_hybrid_for_user.
+        """
+        df = self.search_text(query, k=n)
+        if df.empty:
+            return {}
+        s = df["search_score"].to_numpy(dtype=float)
+        r = 1.0 + 4.0 * s / (s.max() or 1.0)
+        return {int(pid): float(v) for pid, v in zip(df["id"], r)}
+
+    def facet_mask(self, city=None, category=None, min_price=None, max_price=None):
+        """
+        Gabungkan (AND) facet yang sudah dihitung jadi satu mask bool urutan CF.
+          - city / category: cocok persis (case-insensitive), category per token "A,B"
+          - min_price / max_price: rentang price_num via index harga terurut
+        Return None kalau tidak ada filter sama sekali.
+        """
+        n = len(self.item_ids)
+        mask = None
+
+        def _and(m):
+            nonlocal mask
+            mask = m.copy() if mask is None else (mask & m)
+
+        if city:
+            _and(self._facet_city.get(str(city).strip().lower(), np.zeros(n, dtype=bool)))
+        if category:
+            _and(self._facet_category.get(str(category).strip().lower(), np.zeros(n, dtype=bool)))
+        if (min_price is not None or max_price is not None) and self._price_order is not None:
+            lo = 0 if min_price is None else np.searchsorted(self._price_sorted, float(min_price), "left")
+            hi = n if max_price is None else np.searchsorted(self._price_sorted, float(max_price), "right")
+            m = np.zeros(n, dtype=bool)
+            m[self._price_order[lo:hi]] = True
+            _and(m)
+        return mask
+
+    def recommend_hybrid_for_user(self, user_ratings: dict, k=20, alpha=0.6, mask_seen=True,
+                                  filters: dict | None = None):
         """
         Rekomendasi HYBRID (CF + CBF):
           - s_cf: skor dari pola rating antar item (item-item similarity)
           - s_cbf: skor dari kemiripan konten (TF-IDF + numerik)
           - Normalisasi 0..1 lalu blend: s = alpha*s_cf + (1-alpha)*s_cbf
-          - Item yang sudah dirating user dimask agar tidak direkomendasikan ulang.
-        """
-        # --- CF score ---
-        # Bentuk vektor rating sementara sepanjang jumlah item CF.
-        s_cf = np.zeros(len(self.item_ids), dtype=float)
-        if self.item_sim is not None and len(self.item_ids) > 0:
-            v = np.zeros(len(self.item_ids), dtype=float)  # semua 0 (belum rating)
-            for pid, r in (user_ratings or {}).items():
-                j = self.item_to_col.get(int(pid))  # cari kolom item CF
-                if j is not None:
-                    v[j] = float(r)                 # isi rating user untuk item tersebut
-            s_cf = self.item_sim.dot(v)             # skor = kombinasi kemiripan * rating
-
-        # --- CBF score (linear comb of similarities) ---
-        # s_cbf dihitung di ruang konten (CBF), berdasarkan cosine dari vektor fitur item.
-        s_cbf = np.zeros(len(self.place_id_order), dtype=float)
-        if self.X is not None:
-            pid_to_row = {pid: i for i, pid in enumerate(self.place_id_order)}
-            for pid, r in (user_ratings or {}).items():
-                i = pid_to_row.get(int(pid))        # baris CBF untuk item yang dirating user
-                if i is not None:
-                    sims = cosine_similarity(self.X[i], self.X).ravel()  # kemiripan ke semua item
-                    s_cbf += sims * float(r)        # boboti sesuai rating user
-
-        # --- Mask already-seen (from CF space) ---
-        # Agar tidak menyarankan item yang sudah dirating user.
-        seen_cols = set()
-        for pid in (user_ratings or {}):
-            j = self.item_to_col.get(int(pid))
-            if j is not None:
-                seen_cols.add(j)
-
-        # --- Align CBF score to CF order ---
-        # s_cbf masih dalam urutan CBF; perlu disejajarkan dengan urutan item CF.
-        pid_to_row = {pid: i for i, pid in enumerate(self.place_id_order)}
-        s_cbf_aligned = np.zeros_like(s_cf)
-        for idx, pid in enumerate(self.item_ids):
-            i = pid_to_row.get(pid)
-            if i is not None:
-                s_cbf_aligned[idx] = s_cbf[i]
-
-        # --- Normalize helper ---
-        # Bawa ke 0..1 agar skala CF & CBF adil saat digabung.
-        def norm01(x: np.ndarray) -> np.ndarray:
-            mn, mx = np.nanmin(x), np.nanmax(x)
-            if not np.isfinite(mn) or not np.isfinite(mx) or mx - mn < 1e-9:
-                return np.zeros_like(x)
-            return (x - mn) / (mx - mn + 1e-9)
+          - Item yang sudah dirating user dimask agar tidak direkomendasikan ulang
+            (mask_seen=False untuk rating semu, mis. hasil seed_ratings_from_query).
+          - filters (city/category/min_price/max_price) → facet_mask diterapkan
+            sebelum Top-K, jadi hasil tetap K item selama ada ≥K yang lolos filter.
+          - candidate_budget > 0 → dua tahap: kandidat murah dulu (tetangga item
+            yang dirating + populer, sudah difilter), lalu skor exact hanya di kandidat.
+          - n_shards > 1 → skor penuh dihitung paralel per partisi item (ShardedScorer),
+            hasil identik dengan versi satu proses; worker gagal → fallback _blend.
+        """
+        cols, vals = self.ratings_to_cf(user_ratings)
+        return self.recommend_hybrid_sparse(cols, vals, k=k, alpha=alpha,
+                                            mask_seen=mask_seen, filters=filters)
 
+    def recommend_hybrid_sparse(self, cols: np.ndarray, vals: np.ndarray, k=20, alpha=0.6,
+                                mask_seen=True, filters: dict | None = None, uid: int | None = None):
+        """
+        Sama dengan recommend_hybrid_for_user, tapi preferensi user sudah dalam
+        bentuk sparse ruang CF: `cols` (index kolom CF) & `vals` (rating), mis. dari UserPrefStore.
+        `uid` + accumulator_size > 0 → skor mentah diambil dari akumulator user
+        (hanya norm01 + Top-K yang dihitung ulang).
+        """
+        cols = np.asarray(cols, dtype=np.int64)
+        vals = np.asarray(vals, dtype=float)
+        allowed = self.facet_mask(**filters) if filters else None
+        seen = cols if mask_seen else cols[:0]
+        if uid is not None and self.accumulator_size > 0:
+            s_cf, s_cbf = self._accumulated(uid, cols, vals)
+            s = alpha * norm01(s_cf) + (1 - alpha) * norm01(s_cbf)
+        elif self.candidate_budget > 0:
+            cand = self.generate_candidates(cols, seen=seen, allowed=allowed)
+            return self._rank(cand, self._blend(cols, vals, alpha, cand), k)
+        else:
+            if self.sharded is not None:
+                ranked = self._sharded_rank(cols, vals, alpha, k, seen, allowed)
+                if ranked is not None:
+                    return ranked
+            s = self._blend(cols, vals, alpha)
+
+        # Skor penuh di seluruh katalog, lalu mask seen & facet sebelum Top-K.
+        s[seen] = -np.inf
+        if allowed is not None:
+            s[~allowed] = -np.inf
+        k = min(k, len(s) - 1) if len(s) > 1 else 1
+        return self._rank(np.arange(len(s)), s, k)
+
+    def _sharded_rank(self, cols, vals, alpha, k, seen, allowed):
+        """Top-K lewat ShardedScorer; None kalau worker gagal → pemanggil pakai _blend."""
+        from .sharding import ShardError
+        sh = self.sharded
+        if sh is None:
+            return None
+        n = len(self.item_ids)
+        k = min(k, n - 1) if n > 1 else 1
+        try:
+            idx, sc = sh.topk(cols, vals, alpha, k, seen=seen, allowed=allowed)
+        except ShardError as e:
+            warnings.warn(f"Skor ter-shard gagal, fallback ke satu proses: {e}")
+            if not sh.alive:  # semua lane mati → berhenti pakai sharding
+                self.sharded = None
+                sh.close()
+            return None
+        return self._rank(idx, sc, k)
+
+    def generate_candidates(self, cols: np.ndarray, seen=None, allowed=None,
+                            budget: int | None = None) -> np.ndarray:
+        """
+        Tahap 1 (murah): union kolom CF dari
+          - tetangga item yang dirating (tabel similar_ids, candidate_neighbors per item)
+          - item populer (paling banyak dirating, candidate_popular teratas)
+          - item yang lolos filter (populer dulu) untuk menutup sisa budget
+        dibatasi `budget` item, tanpa item seen dan hanya yang lolos `allowed`.
+        """
+        budget = int(budget or self.candidate_budget or len(self.item_ids))
+        parts = []
+        if self.similar_ids is not None and len(cols):
+            parts.append(self.similar_ids[cols, :self.candidate_neighbors].ravel())
+        pop = self._popular_cols
+        parts.append(pop[:self.candidate_popular])
+        if allowed is not None:
+            parts.append(pop[allowed[pop]])
+
+        c = np.concatenate(parts).astype(np.int64)
+        _, first = np.unique(c, return_index=True)
+        c = c[np.sort(first)]                            # union, urutan prioritas tetap
+        keep = np.ones(len(c), dtype=bool)
+        if seen is not None and len(seen):
+            keep &= ~np.isin(c, seen)
+        if allowed is not None:
+            keep &= allowed[c]
+        return c[keep][:budget]
+
+    def candidate_recall(self, users: list[dict], k=20, alpha=None, budget: int | None = None):
+        """
+        Cek offline: rata-rata recall@K Top-K dua tahap terhadap Top-K skor penuh
+        (1.0 = kandidat selalu memuat semua item Top-K versi penuh).
+        """
+        alpha = self.hybrid_alpha if alpha is None else alpha
+        recalls = []
+        for ur in users:
+            cols, vals = self.ratings_to_cf(ur)
+            s = self._blend(cols, vals, alpha)
+            s[cols] = -np.inf
+            kk = min(k, int(np.isfinite(s).sum()))
+            if kk <= 0:
+                continue
+            full = np.argpartition(-s, kth=kk - 1)[:kk]
+            cand = self.generate_candidates(cols, seen=cols, budget=budget)
+            two = cand[np.argsort(-self._blend(cols, vals, alpha, cand), kind="stable")[:kk]]
+            recalls.append(len(np.intersect1d(full, two)) / kk)
+        return float(np.mean(recalls)) if recalls else 0.0
+
+    def ratings_to_cf(self, user_ratings: dict):
+        """{place_id: rating} → (kolom CF, nilai) sebagai array; item di luar ruang CF diabaikan."""
+        pids = np.fromiter((int(p) for p in (user_ratings or {})), dtype=np.int64)
+        vals = np.fromiter((float(r) for r in (user_ratings or {}).values()), dtype=float)
+        return self.pids_to_cf(pids, vals)
+
+    def pids_to_cf(self, pids: np.ndarray, vals: np.ndarray):
+        """Versi vektor: array place_id & rating → (kolom CF, nilai) lewat lookup array pid → kolom."""
+        pids = np.asarray(pids, dtype=np.int64)
+        vals = np.asarray(vals, dtype=float)
+        lut = self._col_of_pid
+        ok = (pids >= 0) & (pids < len(lut))
+        cols = np.full(len(pids), -1, dtype=np.int64)
+        cols[ok] = lut[pids[ok]]
+        keep = cols >= 0
+        return cols[keep], vals[keep]
+
+    def apply_rating_deltas(self, uid: int, changes):
+        """
+        Fold-in rating baru ke akumulator user (kalau ada) tanpa hitung ulang penuh.
+        `changes` = [(place_id, rating_lama_atau_0, rating_baru), ...]; per item cukup
+        tambah satu kolom item_sim dan satu baris cosine CBF dikali delta → O(n).
+        Engine CF yang tidak linear (ALS) → akumulator user dibuang, dihitung ulang nanti.
+        Delta hanya ditambahkan kalau akumulator memang masih memegang rating lama item tsb;
+        sudah berisi rating baru (mis. dibangun ulang oleh request lain setelah commit) →
+        dilewati, selain itu → akumulator dibuang (tidak pernah ditambah dua kali).
+        """
+        if self.accumulator_size <= 0:
+            return
+        with self._acc_lock:
+            e = self._acc.get(int(uid))
+            if e is None:
+                return
+            if self.cf is None or not self.cf.supports_deltas:
+                self._acc.pop(int(uid), None)
+                return
+            for pid, old, new in changes:
+                j = self.item_to_col.get(int(pid))
+                old, new = float(old or 0.0), float(new)
+                if j is None or new == old:
+                    continue
+                cur = e["prefs"].get(j, 0.0)
+                if cur == new:
+                    continue
+                if cur != old:
+                    self._acc.pop(int(uid), None)
+                    return
+                delta = new - old
+                e["s_cf"] += self.cf.column(j) * delta
+                if self._Xcf is not None:
+                    e["s_cbf"] += (self._Xcf @ self._Xcf[j].T).toarray().ravel() * delta
+                e["prefs"][j] = float(new)
+
+    def _accumulated(self, uid: int, cols: np.ndarray, vals: np.ndarray):
+        """
+        Skor mentah (s_cf, s_cbf) user dari akumulator. Dicocokkan dulu dengan preferensi
+        terbaru dari DB; kalau beda (mis. rating diubah lewat proses/worker lain) → hitung ulang.
+        """
+        uid = int(uid)
+        prefs = dict(zip(cols.tolist(), vals.tolist()))
+        with self._acc_lock:
+            e = self._acc.get(uid)
+            if e is not None and e["prefs"] == prefs:
+                self._acc.move_to_end(uid)
+                return e["s_cf"].copy(), e["s_cbf"].copy()
+
+        s_cf, s_cbf = self._raw_scores(cols, vals)
+        with self._acc_lock:
+            self._acc[uid] = {"prefs": prefs, "s_cf": s_cf.copy(), "s_cbf": s_cbf.copy()}
+            self._acc.move_to_end(uid)
+            while len(self._acc) > self.accumulator_size:
+                self._acc.popitem(last=False)
+        return s_cf, s_cbf
+
+    def _blend(self, cols: np.ndarray, vals: np.ndarray, alpha: float, cand=None) -> np.ndarray:
+        """Skor hybrid exact di kolom `cand`: norm01 (di atas `cand` saja) lalu blend alpha."""
+        if cand is not None and len(cand) == 0:  # tidak ada kandidat lolos filter / belum dirating
+            return np.empty(0, dtype=float)
+        s_cf, s_cbf = self._raw_scores(cols, vals, cand)
         # Blend dengan alpha: makin besar alpha -> CF lebih dominan.
-        s = alpha * norm01(s_cf) + (1 - alpha) * norm01(s_cbf_aligned)
-
-        # Mask tempat yang sudah dirating (set -inf).
-        for j in seen_cols:
-            s[j] = -np.inf
+        return alpha * norm01(s_cf) + (1 - alpha) * norm01(s_cbf)
 
-        # Ambil Top-K skor terbesar.
-        k = min(k, len(s) - 1) if len(s) > 1 else 1
+    def _raw_scores(self, cols: np.ndarray, vals: np.ndarray, cand=None):
+        """
+        Skor mentah untuk kolom `cand` (None = semua item):
+          s_cf  = engine CF, mis. item_sim[cand][:, cols] @ vals (kombinasi kemiripan * rating)
+          s_cbf = Xcf[cand] @ (Xcf[cols].T @ vals)         (jumlah cosine * rating)
+        """
+        n = len(self.item_ids) if cand is None else len(cand)
+        s_cf = np.zeros(n, dtype=float)
+        if self.cf is not None and len(cols):
+            s_cf = self.cf.score(cols, vals, cand)
+
+        s_cbf = np.zeros(n, dtype=float)
+        if self._Xcf is not None and len(cols):
+            q = self._Xcf[cols].T @ vals                  # profil konten user (dimensi fitur)
+            Xc = self._Xcf if cand is None else self._Xcf[cand]
+            s_cbf = np.asarray(Xc @ q).ravel()
+        return s_cf, s_cbf
+
+    def raw_scores_batch(self, C: csr_matrix, cf=None):
+        """
+        Versi batch _raw_scores untuk banyak user sekaligus: C = CSR (b × n_item)
+        rating di ruang CF. Return (s_cf, s_cbf) dense b × n_item.
+        `cf` = engine lain (mis. dilatih ulang di split train saat evaluasi offline).
+        """
+        cf = self.cf if cf is None else cf
+        C = csr_matrix(C, dtype=float)
+        b, n = C.shape[0], len(self.item_ids)
+        s_cf = np.zeros((b, n)) if cf is None else np.asarray(cf.score_batch(C), dtype=float)
+        s_cbf = np.zeros((b, n))
+        if self._Xcf is not None:
+            s_cbf = np.asarray(((C @ self._Xcf) @ self._Xcf.T).toarray())
+        return s_cf, s_cbf
+
+    def _rank(self, cand: np.ndarray, s: np.ndarray, k: int):
+        """Top-K dari skor `s` (sejajar dengan kolom CF `cand`) → DataFrame metadata untuk UI."""
+        k = min(int(k), int(np.isfinite(s).sum()))
+        cols = ["place_name", "city", "category", "price", "rating", "image"]
+        if k <= 0:
+            return pd.DataFrame(columns=["id"] + cols + ["hybrid_score"])
         top_idx = np.argpartition(-s, kth=k - 1)[:k]
         top_idx = top_idx[np.argsort(-s[top_idx])]
 
         # Petakan index CF → place_id → lengkapi metadata untuk UI.
-        top_pids = [self.item_ids[j] for j in top_idx]
-        cols = ["place_name", "city", "category", "price", "rating", "image"]
-        meta = (
-            self.places_df.set_index("id")
-            .reindex(top_pids)[cols]
-            .reset_index()
-            .rename(columns={"index": "place_id"})
-        )
+        top_pids = [self.item_ids[j] for j in cand[top_idx]]
+        meta = self._meta.reindex(top_pids).reset_index().rename(columns={"index": "place_id"})
         meta["hybrid_score"] = np.array(s[top_idx]).round(4)  # untuk debugging/penjelasan di UI
         return meta
 
+    def similar_places(self, place_id: int, k=10):
+        """
+        Tempat serupa untuk halaman Detail, dibaca dari tabel tetangga yang sudah
+        dihitung saat load (O(k) per request, tanpa cosine ke seluruh katalog).
+        """
+        j = self.item_to_col.get(int(place_id))
+        cols = ["place_name", "city", "category", "price", "rating", "image"]
+        if j is None or self.similar_ids is None:
+            return pd.DataFrame(columns=["id"] + cols + ["similar_score"])
+
+        k = max(0, min(int(k), self.similar_ids.shape[1]))
+        nb, sc = self.similar_ids[j, :k], self.similar_scores[j, :k]
+        keep = np.isfinite(sc)
+        top_pids = [self.item_ids[c] for c in nb[keep]]
+        meta = self._meta.reindex(top_pids).reset_index()
+        meta["similar_score"] = np.round(sc[keep].astype(float), 4)
+        return meta
+
     # ---------- Loaders ----------
     def _load_all(self):
         """Load artefak CBF & CF, lalu ratakan ID supaya konsisten."""
         self._load_cbf()
         self._load_cf()
         self._sanity_align_ids()
+        self._align_cbf_to_cf()
+        self._load_similar_table()
+        self._build_facets()
+        self._build_popularity()
 
     def _load_cbf(self):
         """Load artefak Content-Based Filtering + metadata places."""
@@ -166,6 +529,7 @@ class RecommenderService:
         self.num_cols = obj.get("num_cols", [])
         self.place_id_order = list(obj.get("place_id_order", []))
         self.X = load_npz(mat_p)  # matriks fitur item (sparse)
+        self._build_text_index()
 
         # ---- Load places metadata ----
         df = None
@@ -239,25 +603,73 @@ class RecommenderService:
         df["rating"] = pd.to_numeric(df.get("rating", 0.0), errors="coerce").fillna(0.0)
 
         self.places_df = df
+        self._meta = df.set_index("id")[META_COLS]
+
+    def _build_text_index(self):
+        """
+        Bangun inverted index dari bagian teks X (kolom TF-IDF, sebelum kolom numerik):
+        format CSC → postings per term sudah bersebelahan (indptr/indices/data).
+        """
+        if self.tfidf is None or self.X is None:
+            return
+        vocab = getattr(self.tfidf, "vocabulary_", None) or {}
+        n_text = self.X.shape[1] - len(self.num_cols)
+        if not vocab or n_text != len(vocab):
+            return  # artefak tidak konsisten → fitur search nonaktif
+
+        T = self.X[:, :n_text].tocsc()
+        T.sort_indices()
+        self._post_ptr = T.indptr.astype(np.int64)
+        self._post_rows = T.indices.astype(np.int32)
+        self._post_w = T.data.astype(np.float32)
+        self._analyzer = self.tfidf.build_analyzer()
+
+        # idf_ disimpan sebagai atribut biasa di sklearn baru, tapi property di versi lama;
+        # ambil langsung dari __dict__ agar tetap jalan walau beda versi saat unpickle.
+        tr = getattr(self.tfidf, "_tfidf", None)
+        idf = vars(tr).get("idf_") if tr is not None else None
+        if idf is None:
+            try:
+                idf = self.tfidf.idf_
+            except Exception:
+                idf = None
+        self._idf = np.asarray(idf, dtype=float) if idf is not None else None
 
     def _load_cf(self):
-        """Load artefak Collaborative Filtering (item-item similarity)."""
-        sim_p = self.cf_dir / "cf_item_sim.npy"
+        """Load artefak Collaborative Filtering sesuai engine (item-item similarity / ALS)."""
         art_p = self.cf_dir / "cf_artifacts.joblib"
+        if self.cf_engine == "als":
+            model_p = self.cf_dir / "als_factors.npz"
+            hint = "Latih dulu: python -m backend.mf train"
+        elif self.cf_engine == "itemsim":
+            model_p = self.cf_dir / "cf_item_sim.npy"
+            hint = ""
+        else:
+            raise ValueError(f"cf_engine tidak dikenal: {self.cf_engine!r} (itemsim | als)")
 
-        if not (sim_p.exists() and art_p.exists()):
+        if not (model_p.exists() and art_p.exists()):
             raise FileNotFoundError(
                 f"CF artefak tidak ditemukan di {self.cf_dir}. "
-                f"Harus ada 'cf_item_sim.npy' dan 'cf_artifacts.joblib'."
+                f"Harus ada '{model_p.name}' dan 'cf_artifacts.joblib'. {hint}".strip()
             )
 
-        self.item_sim = np.load(sim_p)
+        if self.cf_engine == "als":
+            self.cf = ALSEngine.load(model_p)
+        else:
+            self.item_sim = np.load(model_p)
+            self.cf = ItemSimEngine(self.item_sim)
         with warnings.catch_warnings():
             warnings.simplefilter("ignore", InconsistentVersionWarning)
             obj = joblib.load(art_p)
         self.item_ids = list(obj.get("item_ids", []))
         self.item_to_col = dict(obj.get("item_to_col", {}))
 
+        ui_p = self.cf_dir / "ui_matrix_csr.npz"
+        if ui_p.exists():
+            ui = load_npz(ui_p).tocsr()
+            if ui.shape[1] == len(self.item_ids):
+                self.ui = ui
+
     def _sanity_align_ids(self):
         """
         Ratakan konsistensi ID:
@@ -271,8 +683,158 @@ class RecommenderService:
         keep_mask = np.array([pid in valid_ids for pid in self.item_ids], dtype=bool)
         if keep_mask.size and (not keep_mask.all()):
             idx = np.where(keep_mask)[0]
-            # Potong matriks similarity ke item yang valid saja.
-            self.item_sim = self.item_sim[np.ix_(idx, idx)]
+            # Potong matriks similarity / faktor item ke item yang valid saja.
+            self.cf = self.cf.subset(idx)
+            if self.item_sim is not None:
+                self.item_sim = self.cf.item_sim
+            if self.ui is not None:
+                self.ui = self.ui[:, idx]
             # Susun ulang daftar item dan mapping-nya.
             self.item_ids = [self.item_ids[i] for i in idx]
             self.item_to_col = {pid: j for j, pid in enumerate(self.item_ids)}
+
+    def _align_cbf_to_cf(self):
+        """Susun baris CBF (ternormalisasi L2 → dot = cosine) mengikuti urutan kolom CF."""
+        if not self.item_ids:
+            return
+        ids = np.asarray(self.item_ids, dtype=np.int64)
+        self._col_of_pid = np.full(int(ids.max()) + 1, -1, dtype=np.int64)
+        self._col_of_pid[ids] = np.arange(len(ids))
+
+        if self.X is None:
+            return
+        pid_to_row = {pid: i for i, pid in enumerate(self.place_id_order)}
+        rows = np.array([pid_to_row.get(pid, -1) for pid in self.item_ids], dtype=np.int64)
+        self._cbf_row_of_col = rows
+
+        # Matriks seleksi P (n_cf × n_cbf): Xcf = P @ Xn, baris tanpa pasangan CBF jadi nol.
+        ok = np.where(rows >= 0)[0]
+        P = csr_matrix(
+            (np.ones(len(ok)), (ok, rows[ok])),
+            shape=(len(self.item_ids), self.X.shape[0]),
+        )
+        self._Xcf = (P @ normalize(self.X.tocsr(), norm="l2")).tocsr()
+
+    def _similar_artifact_ok(self, z, path: Path, topn: int) -> bool:
+        """Artefak cocok: katalog/engine/alpha sama, topn cukup, dan tidak lebih tua dari model."""
+        model_p = self.cf_dir / ("als_factors.npz" if self.cf_engine == "als" else "cf_item_sim.npy")
+        inputs = [p for p in (model_p, self.cbf_dir / "cbf_item_matrix.npz") if p.exists()]
+        return (
+            str(z["engine"]) == self.cf_engine
+            and float(z["alpha"]) == self.hybrid_alpha
+            and z["ids"].shape[1] >= topn
+            and np.array_equal(z["item_ids"], np.asarray(self.item_ids, dtype=np.int64))
+            and all(path.stat().st_mtime >= p.stat().st_mtime for p in inputs)
+        )
+
+    def _load_similar_table(self):
+        """
+        Tabel tetangga dari artefak offline (cf_dir/similar_topn.npz) kalau cocok.
+        Tanpa artefak yang cocok, build O(n²) saat load hanya untuk katalog kecil
+        (≤ similar_build_max item); katalog lebih besar → tabel kosong + peringatan.
+        """
+        n = len(self.item_ids)
+        topn = min(self.similar_topn, n - 1)
+        if self.cf is None or self._Xcf is None or topn <= 0:
+            return
+
+        path = self.cf_dir / SIMILAR_FILE
+        if path.exists():
+            with np.load(path) as z:
+                if self._similar_artifact_ok(z, path, topn):
+                    self.similar_ids = np.ascontiguousarray(z["ids"][:, :topn])
+                    self.similar_scores = np.ascontiguousarray(z["scores"][:, :topn])
+                    return
+            warnings.warn(f"{path} tidak cocok dengan artefak / engine / alpha saat ini, diabaikan.")
+
+        if n > self.similar_build_max:
+            warnings.warn(
+                f"Katalog {n} item > similar_build_max={self.similar_build_max}: tabel tempat "
+                f"serupa tidak dibangun saat load. Jalankan: python -m backend.build_similar"
+            )
+            return
+        self.build_similar_table(topn)
+
+    def save_similar_table(self, path: str | Path | None = None) -> Path:
+        """Simpan tabel tetangga + metadata validasi ke npz (default cf_dir/similar_topn.npz)."""
+        path = Path(path) if path is not None else self.cf_dir / SIMILAR_FILE
+        np.savez(
+            path,
+            ids=self.similar_ids,
+            scores=self.similar_scores,
+            item_ids=np.asarray(self.item_ids, dtype=np.int64),
+            engine=np.array(self.cf_engine),
+            alpha=np.array(self.hybrid_alpha),
+        )
+        return path
+
+    def build_similar_table(self, topn: int, chunk: int = 512, max_block: int = 1 << 24):
+        """
+        Precompute top-N tetangga per item dengan semantik sama seperti
+        recommend_hybrid_for_user({pid: r}) : norm01(CF) & norm01(CBF) diblend
+        dengan hybrid_alpha, item itu sendiri dimask.
+        Dikerjakan per blok baris; blok dibatasi ≤ max_block skor (chunk × n) supaya
+        memori tetap terkendali di katalog besar.
+        """
+        n = len(self.item_ids)
+        topn = min(int(topn), n - 1)
+        if self.cf is None or self._Xcf is None or topn <= 0:
+            return
+        chunk = max(1, min(chunk, max_block // max(n, 1)))
+
+        alpha = self.hybrid_alpha
+        ids = np.empty((n, topn), dtype=np.int32)
+        scores = np.empty((n, topn), dtype=np.float32)
+        for a in range(0, n, chunk):
+            b = min(a + chunk, n)
+            E = csr_matrix((np.ones(b - a), (np.arange(b - a), np.arange(a, b))), shape=(b - a, n))
+            s_cf, s_cbf = self.raw_scores_batch(E)                  # = skor untuk rating e_j
+            s = alpha * norm01(s_cf, axis=1) + (1 - alpha) * norm01(s_cbf, axis=1)
+            s[np.arange(b - a), np.arange(a, b)] = -np.inf          # jangan sarankan diri sendiri
+
+            top = np.argpartition(-s, kth=topn - 1, axis=1)[:, :topn]
+            top_s = np.take_along_axis(s, top, axis=1)
+            order = np.argsort(-top_s, axis=1)
+            ids[a:b] = np.take_along_axis(top, order, axis=1)
+            scores[a:b] = np.take_along_axis(top_s, order, axis=1)
+
+        self.similar_ids = ids
+        self.similar_scores = scores
+
+    def _build_facets(self):
+        """Precompute bitmap kota, bitmap per token kategori, dan index harga (urutan CF)."""
+        n = len(self.item_ids)
+        if n == 0:
+            return
+        meta = self.places_df.set_index("id").reindex(self.item_ids)
+
+        def _bitmaps(values):
+            out: dict[str, np.ndarray] = {}
+            for j, toks in enumerate(values):
+                for t in toks:
+                    if t:
+                        out.setdefault(t, np.zeros(n, dtype=bool))[j] = True
+            return out
+
+        cities = meta["city"].fillna("").astype(str).str.strip().str.lower()
+        self._facet_city = _bitmaps([[c] for c in cities])
+        cats = meta["category"].fillna("").astype(str).str.lower().str.split(",")
+        self._facet_category = _bitmaps([[t.strip() for t in ts] for ts in cats])
+
+        if "price_num" in meta.columns:
+            price = pd.to_numeric(meta["price_num"], errors="coerce")
+        else:
+            from .utils import parse_price_idr
+            price = meta["price"].apply(parse_price_idr)
+        price = price.fillna(0.0).to_numpy(dtype=float)
+        self._price_order = np.argsort(price, kind="stable")
+        self._price_sorted = price[self._price_order]
+
+    def _build_popularity(self):
+        """Urutan kolom CF dari yang paling banyak dirating (ui_matrix), seri → rating tertinggi."""
+        n = len(self.item_ids)
+        rating = pd.to_numeric(
+            self.places_df.set_index("id").reindex(self.item_ids)["rating"], errors="coerce"
+        ).fillna(0.0).to_numpy()
+        count = np.bincount(self.ui.indices, minlength=n) if self.ui is not None else np.zeros(n)
+        self._popular_cols = np.lexsort((-rating, -count)).astype(np.int64)
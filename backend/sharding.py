@@ -0,0 +1,350 @@
+"""
+Skor hybrid paralel per partisi item untuk katalog sangat besar.
+
+Ruang item (urutan kolom CF) dibagi jadi partisi bersebelahan [a, b). Artefak CF
+(item_sim atau faktor item ALS) dan baris CBF (Xcf, CSR) ditaruh SEKALI di shared
+memory; tiap worker process hanya memakai view partisinya sendiri (tanpa salinan).
+
+Satu request = dua putaran supaya norm01 persis sama dengan versi satu proses:
+  1) "stats": tiap shard hitung s_cf & s_cbf mentah partisinya, kirim min/max
+  2) "topk" : koordinator gabung min/max global → tiap shard normalisasi, blend,
+              mask seen/facet, lalu kirim Top-K lokal; koordinator merge Top-K.
+Worker yang mati / macet / error → ShardError; RecommenderService lalu menghitung
+request itu di satu proses (_blend) sehingga request tidak pernah menggantung.
+
+Benchmark (data sintetis, engine ALS):
+    python -m backend.sharding --items 1000000 --shards 1,2,4
+"""
+import argparse
+import atexit
+import os
+import queue
+import time
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .mf import ALSEngine, ItemSimEngine
+from .recommender import scale01
+
+
+# ---------- Shared memory helpers ----------
+def _to_shm(arr: np.ndarray):
+    arr = np.ascontiguousarray(arr)
+    shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, {"name": shm.name, "shape": arr.shape, "dtype": arr.dtype.str}
+
+
+def _from_shm(spec):
+    shm = SharedMemory(name=spec["name"])
+    return shm, np.ndarray(spec["shape"], dtype=np.dtype(spec["dtype"]), buffer=shm.buf)
+
+
+# ---------- Worker ----------
+def _shard_worker(conn, a: int, b: int, kind: str, specs: dict, n_features: int):
+    """Loop worker: pegang view partisi [a, b) dan simpan skor mentah request berjalan."""
+    handles, arrs = [], {}
+    for key, spec in specs.items():
+        shm, arr = _from_shm(spec)
+        handles.append(shm)
+        arrs[key] = arr
+
+    cf = arrs["cf"][a:b]                                    # baris item_sim / faktor item
+    indptr = arrs["indptr"]
+    p0, p1 = int(indptr[a]), int(indptr[b])
+    X = csr_matrix(
+        (arrs["data"][p0:p1], arrs["indices"][p0:p1], indptr[a:b + 1] - p0),
+        shape=(b - a, n_features),
+    )
+    s_cf = s_cbf = None
+    conn.send(("ok", "ready"))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:                                    # koordinator sudah hilang
+            break
+        op = msg[0]
+        if op == "stop":
+            break
+        # Error satu request dikirim balik ke koordinator; loop worker tetap hidup.
+        try:
+            if op == "stats":
+                _, cols, vals, u, q_idx, q_val = msg
+                s_cf = cf[:, cols] @ vals if kind == "itemsim" else cf @ u
+                q = np.zeros(X.shape[1])
+                q[q_idx] = q_val
+                s_cbf = np.asarray(X @ q).ravel()
+                out = (np.nanmin(s_cf), np.nanmax(s_cf), np.nanmin(s_cbf), np.nanmax(s_cbf))
+            elif op == "topk":
+                _, stats, alpha, k, seen, allowed = msg
+                mn_cf, mx_cf, mn_cbf, mx_cbf = stats
+                s = alpha * scale01(s_cf, mn_cf, mx_cf) + (1 - alpha) * scale01(s_cbf, mn_cbf, mx_cbf)
+                local = seen[(seen >= a) & (seen < b)] - a
+                s[local] = -np.inf
+                if allowed is not None:
+                    s[~allowed] = -np.inf
+                kk = min(k, int(np.isfinite(s).sum()))
+                top = np.argpartition(-s, kth=kk - 1)[:kk] if kk > 0 else np.empty(0, dtype=np.int64)
+                out = (top + a, s[top])
+            else:
+                raise ValueError(f"op tidak dikenal: {op!r}")
+        except Exception as e:
+            s_cf = s_cbf = None
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+        else:
+            conn.send(("ok", out))
+
+    for shm in handles:
+        shm.close()
+    conn.close()
+
+
+# ---------- Koordinator ----------
+class ShardError(RuntimeError):
+    """Worker shard mati, timeout, atau melempar error → pemanggil fallback ke satu proses."""
+
+
+_NO_LANES = object()  # sentinel di antrean lane: semua lane sudah mati / ditutup
+
+
+class ShardedScorer:
+    """
+    Skor hybrid penuh yang dibagi ke `n_shards` worker process.
+    topk() menghasilkan skor & urutan yang sama dengan RecommenderService._blend
+    + mask + Top-K di satu proses.
+
+    `lanes` = jumlah grup worker (masing-masing n_shards proses, shared memory sama)
+    sehingga beberapa request bisa jalan bersamaan. Tiap balasan ditunggu paling lama
+    `timeout` detik; lane yang worker-nya mati / macet dimatikan dan topk() melempar
+    ShardError. Kalau semua lane sudah mati, `alive` = False.
+    """
+
+    def __init__(self, cf, Xcf: csr_matrix, n_shards: int = 2, lanes: int = 1,
+                 timeout: float = 10.0):
+        self.cf = cf
+        self.Xcf = Xcf.tocsr()
+        self.n_items = self.Xcf.shape[0]
+        self.n_shards = max(1, min(int(n_shards), self.n_items))
+        self.timeout = float(timeout)
+        self._lanes: list[dict] = []
+        self._free: queue.Queue = queue.Queue()
+
+        if isinstance(cf, ItemSimEngine):
+            kind, cf_arr = "itemsim", cf.item_sim
+        elif isinstance(cf, ALSEngine):
+            kind, cf_arr = "als", cf.item_factors
+        else:
+            raise TypeError(f"Engine CF tidak didukung untuk sharding: {type(cf).__name__}")
+        self.kind = kind
+
+        self._shms, specs = [], {}
+        for key, arr in {
+            "cf": cf_arr,
+            "data": self.Xcf.data,
+            "indices": self.Xcf.indices,
+            "indptr": self.Xcf.indptr.astype(np.int64),
+        }.items():
+            shm, specs[key] = _to_shm(arr)
+            self._shms.append(shm)
+
+        # Partisi bersebelahan, ukuran hampir sama.
+        bounds = np.linspace(0, self.n_items, self.n_shards + 1).astype(int)
+        self.bounds = list(zip(bounds[:-1], bounds[1:]))
+
+        # Worker 1 thread BLAS saja supaya n_shards proses tidak saling rebut core.
+        ctx = get_context("spawn")
+        saved = {v: os.environ.get(v) for v in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({v: "1" for v in saved})
+        try:
+            for i in range(max(1, int(lanes))):
+                lane = {"id": i, "conns": [], "procs": []}
+                for a, b in self.bounds:
+                    parent, child = ctx.Pipe()
+                    p = ctx.Process(
+                        target=_shard_worker,
+                        args=(child, int(a), int(b), kind, specs, self.Xcf.shape[1]),
+                        daemon=True,
+                    )
+                    p.start()
+                    child.close()  # EOF di sisi koordinator kalau worker mati
+                    lane["conns"].append(parent)
+                    lane["procs"].append(p)
+                self._lanes.append(lane)
+        finally:
+            for v, old in saved.items():
+                if old is None:
+                    os.environ.pop(v, None)
+                else:
+                    os.environ[v] = old
+        atexit.register(self.close)
+
+        # Tunggu semua worker selesai import + attach shared memory, supaya timeout
+        # per request tidak termakan waktu start proses spawn.
+        try:
+            for lane in self._lanes:
+                self._recv_all(lane, time.monotonic() + max(self.timeout, 120.0))
+                self._free.put(lane)
+        except ShardError:
+            self.close()
+            raise
+
+    @property
+    def alive(self) -> bool:
+        return bool(self._lanes)
+
+    def _recv_all(self, lane: dict, deadline: float) -> list:
+        out = []
+        for c, p in zip(lane["conns"], lane["procs"]):
+            while not c.poll(min(0.05, max(deadline - time.monotonic(), 0))):
+                if not p.is_alive():
+                    raise ShardError(f"worker shard {p.pid} mati (exitcode={p.exitcode})")
+                if time.monotonic() >= deadline:
+                    raise ShardError(f"worker shard {p.pid} tidak membalas dalam {self.timeout:g}s")
+            status, payload = c.recv()
+            if status != "ok":
+                raise ShardError(f"worker shard {p.pid}: {payload}")
+            out.append(payload)
+        return out
+
+    def topk(self, cols: np.ndarray, vals: np.ndarray, alpha: float, k: int,
+             seen=None, allowed=None):
+        """Return (kolom CF, skor) gabungan Top-K lokal semua shard (belum diurutkan)."""
+        cols = np.asarray(cols, dtype=np.int64)
+        vals = np.asarray(vals, dtype=float)
+        seen = np.asarray(seen if seen is not None else [], dtype=np.int64)
+        u = self.cf.fold_in(cols, vals) if self.kind == "als" else None
+        q = self.Xcf[cols].T @ vals                         # profil konten user (dimensi fitur)
+        q_idx = np.flatnonzero(q)
+
+        if not self._lanes:
+            raise ShardError("semua worker shard sudah mati")
+        try:
+            lane = self._free.get(timeout=self.timeout)
+        except queue.Empty:
+            raise ShardError(f"tidak ada lane shard bebas dalam {self.timeout:g}s") from None
+        if lane is _NO_LANES:
+            self._free.put(lane)  # teruskan ke thread lain yang juga menunggu
+            raise ShardError("semua worker shard sudah mati")
+
+        deadline = time.monotonic() + self.timeout
+        try:
+            for c in lane["conns"]:
+                c.send(("stats", cols, vals, u, q_idx, q[q_idx]))
+            st = np.array(self._recv_all(lane, deadline), dtype=float)
+            stats = (st[:, 0].min(), st[:, 1].max(), st[:, 2].min(), st[:, 3].max())
+            for c, (a, b) in zip(lane["conns"], self.bounds):
+                c.send(("topk", stats, alpha, k, seen, None if allowed is None else allowed[a:b]))
+            parts = self._recv_all(lane, deadline)
+        except (ShardError, OSError, EOFError) as e:
+            # Balasan yang tertinggal di pipe bikin lane tidak sinkron → matikan saja.
+            self._kill_lane(lane)
+            if isinstance(e, ShardError):
+                raise
+            raise ShardError(f"pipe worker shard putus: {e!r}") from e
+        self._free.put(lane)
+
+        idx = np.concatenate([p[0] for p in parts]).astype(np.int64)
+        sc = np.concatenate([p[1] for p in parts])
+        return idx, sc
+
+    def _kill_lane(self, lane: dict):
+        self._lanes = [ln for ln in self._lanes if ln is not lane]
+        if not self._lanes:
+            self._free.put(_NO_LANES)  # bangunkan request yang sedang menunggu lane bebas
+        for p in lane["procs"]:
+            if p.is_alive():
+                p.kill()  # SIGKILL: juga mengena worker yang macet / di-stop
+            p.join(timeout=1)
+        for c in lane["conns"]:
+            c.close()
+
+    def close(self):
+        lanes, self._lanes = list(getattr(self, "_lanes", [])), []
+        if lanes:
+            self._free.put(_NO_LANES)
+        for lane in lanes:
+            for c in lane["conns"]:
+                try:
+                    c.send(("stop",))
+                except (OSError, BrokenPipeError):
+                    pass
+        for lane in lanes:
+            for p in lane["procs"]:
+                p.join(timeout=5)
+                if p.is_alive():
+                    p.kill()
+            for c in lane["conns"]:
+                c.close()
+        for shm in getattr(self, "_shms", []):
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._shms = []
+
+
+# ---------- Benchmark ----------
+def _single_topk(cf, Xcf, cols, vals, alpha, k, seen):
+    """Referensi satu proses (rumus sama dengan RecommenderService._blend)."""
+    from .recommender import norm01
+    s_cf = cf.score(cols, vals)
+    s_cbf = np.asarray(Xcf @ (Xcf[cols].T @ vals)).ravel()
+    s = alpha * norm01(s_cf) + (1 - alpha) * norm01(s_cbf)
+    s[seen] = -np.inf
+    top = np.argpartition(-s, kth=k - 1)[:k]
+    return top[np.argsort(-s[top])], s
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark skor hybrid ter-shard (data sintetis).")
+    ap.add_argument("--items", type=int, default=200_000)
+    ap.add_argument("--features", type=int, default=20_000)
+    ap.add_argument("--nnz-per-item", type=int, default=30)
+    ap.add_argument("--factors", type=int, default=32)
+    ap.add_argument("--shards", default="1,2,4")
+    ap.add_argument("--requests", type=int, default=20)
+    ap.add_argument("--k", type=int, default=20)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    n, F, z = args.items, args.features, args.nnz_per_item
+    Xcf = csr_matrix(
+        (rng.random(n * z), rng.integers(0, F, n * z), np.arange(0, n * z + 1, z)),
+        shape=(n, F),
+    )
+    from sklearn.preprocessing import normalize
+    Xcf = normalize(Xcf, norm="l2").tocsr()
+    cf = ALSEngine(rng.normal(size=(1, args.factors)), rng.normal(size=(n, args.factors)))
+    users = [(rng.choice(n, size=10, replace=False), rng.integers(1, 6, 10).astype(float))
+             for _ in range(args.requests)]
+
+    t0 = time.perf_counter()
+    ref = [_single_topk(cf, Xcf, c, v, 0.6, args.k, c) for c, v in users]
+    base_ms = (time.perf_counter() - t0) / len(users) * 1000
+    print(f"items={n} features={F} cores={os.cpu_count()}")
+    print(f"{'shards':>6} {'ms/req':>8} {'speedup':>8} {'exact':>6}")
+    print(f"{'-':>6} {base_ms:>8.1f} {1.0:>8.2f} {'ref':>6}")
+
+    for ns in [int(x) for x in args.shards.split(",") if x.strip()]:
+        sh = ShardedScorer(cf, Xcf, n_shards=ns)
+        try:
+            sh.topk(*users[0], 0.6, args.k, seen=users[0][0])  # pemanasan
+            t0 = time.perf_counter()
+            out = [sh.topk(c, v, 0.6, args.k, seen=c) for c, v in users]
+            ms = (time.perf_counter() - t0) / len(users) * 1000
+        finally:
+            sh.close()
+        exact = all(
+            np.allclose(np.sort(sc)[::-1][:args.k], s_ref[top_ref])
+            for (idx, sc), (top_ref, s_ref) in zip(out, ref)
+        )
+        print(f"{ns:>6} {ms:>8.1f} {base_ms / ms:>8.2f} {str(exact):>6}")
+
+
+if __name__ == "__main__":
+    main()
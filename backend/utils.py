@@ -1,9 +1,11 @@
 import os
 import re
+from datetime import date
 import pandas as pd
 import bcrypt
 from pandas.api.types import is_numeric_dtype
-from .models import Place
+from sqlalchemy import inspect, text
+from .models import Place, Event
 
 # ---------- Price helpers ----------
 def parse_price_idr(s):
@@ -39,6 +41,53 @@ def display_price(price_str: str | None, price_num: float | None) -> str:
         return f if f else "-"
     return "-"
 
+# ---------- Date helpers ----------
+BULAN_ID = {
+    "januari": 1, "jan": 1, "februari": 2, "feb": 2, "maret": 3, "mar": 3,
+    "april": 4, "apr": 4, "mei": 5, "juni": 6, "jun": 6, "juli": 7, "jul": 7,
+    "agustus": 8, "agu": 8, "agt": 8, "ags": 8, "september": 9, "sep": 9, "sept": 9,
+    "oktober": 10, "okt": 10, "november": 11, "nov": 11, "desember": 12, "des": 12,
+}
+_DATE_PART = re.compile(r"^(\d{1,2})(?:\s+([a-z]+)\.?)?(?:\s+(\d{4}))?$")
+
+def parse_event_date_range(s):
+    """
+    Parse tanggal event berbahasa Indonesia → (start, end) sebagai date.
+      '19 Agustus 2018'                → (2018-08-19, 2018-08-19)
+      '5 - 7 Agustus 2022'             → (2022-08-05, 2022-08-07)
+      '29 September - 1 Oktober 2022'  → (2022-09-29, 2022-10-01)
+      '30 Des 2022 - 2 Jan 2023'       → (2022-12-30, 2023-01-02)
+    Bulan/tahun yang tidak ditulis di sisi kiri diambil dari sisi kanan.
+    Return (None, None) kalau tidak bisa diparse.
+    """
+    if s is None:
+        return None, None
+    t = re.sub(r"\s+", " ", str(s).strip().lower())
+    parts = [x.strip() for x in re.split(r"\s*(?:-|–|—|s/d|sampai|hingga)\s*", t) if x.strip()]
+    if not 1 <= len(parts) <= 2:
+        return None, None
+    m = [_DATE_PART.match(x) for x in parts]
+    if not all(m):
+        return None, None
+
+    end_d, end_mon, end_y = m[-1].groups()
+    if not end_mon or not end_y or end_mon not in BULAN_ID:
+        return None, None
+    start_d, start_mon, start_y = m[0].groups()
+    if start_mon and start_mon not in BULAN_ID:
+        return None, None
+    try:
+        end = date(int(end_y), BULAN_ID[end_mon], int(end_d))
+        start = date(int(start_y or end_y), BULAN_ID[start_mon or end_mon], int(start_d))
+    except ValueError:
+        return None, None
+    if start > end and not start_y:
+        # mis. '30 Desember - 2 Januari 2023' → mulai di tahun sebelumnya
+        start = start.replace(year=start.year - 1)
+    if start > end:
+        return None, None
+    return start, end
+
 # ---------- Auth helpers ----------
 def hash_password(pw: str) -> bytes:
     return bcrypt.hashpw(pw.encode("utf-8"), bcrypt.gensalt())
@@ -71,6 +120,43 @@ def place_to_dict(p: Place, detail: bool = False):
         })
     return d
 
+def event_to_dict(e: Event):
+    return {
+        "event_id": e.id,
+        "event_name": e.event_name,
+        "event_place": e.event_place,
+        "event_date": e.event_date,
+        "start_date": e.start_date.isoformat() if e.start_date else None,
+        "end_date": e.end_date.isoformat() if e.end_date else None,
+        "city": e.city,
+        "image": e.image,
+        "event_about": e.event_about,
+    }
+
+# ---------- Skema ----------
+def ensure_indexes(db_):
+    """
+    db.create_all() hanya membuat tabel yang belum ada; index yang ditambahkan
+    belakangan di model tidak ikut dibuat di DB lama. Buat yang belum ada di sini.
+    Nama index dibaca langsung dari katalog: refleksi SQLite melewati index ekspresi
+    (mis. lower(city)), jadi checkfirst bawaan akan mencoba membuatnya lagi.
+    """
+    engine = db_.engine
+    for table in db_.metadata.sorted_tables:
+        if not table.indexes:
+            continue
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as conn:
+                have = {n for (n,) in conn.execute(
+                    text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"),
+                    {"t": table.name},
+                )}
+        else:
+            have = {ix["name"] for ix in inspect(engine).get_indexes(table.name)}
+        for idx in table.indexes:
+            if idx.name not in have:
+                idx.create(bind=engine)
+
 # ---------- Sumber CSV ----------
 def _find_places_csv():
     """
@@ -245,3 +331,52 @@ def seed_places_if_empty(db_):
     non_empty_str = int((price_str_ser.fillna("").str.strip() != "").sum())
     non_zero_num = int((price_num_ser.fillna(0.0) > 0).sum())
     print(f"[seed] places terisi: {len(rows)} baris. price_str terisi: {non_empty_str}, price_num>0: {non_zero_num}")
+
+# ---------- Event ----------
+def _event_city(event_place: str, known_cities) -> str:
+    """
+    Kota event dari teks lokasi ('Lapangan Aldiron, Jl. Gatot Subroto, Jakarta').
+    Segmen koma dicek dari belakang; yang cocok (atau diawali) kota di tabel places
+    dipakai apa adanya, mis. 'Jakarta Selatan' → 'Jakarta', supaya bisa di-join ke places.city.
+    Kalau tidak ada yang cocok → segmen terakhir.
+    """
+    segs = [x.strip() for x in str(event_place or "").split(",") if x.strip()]
+    lookup = {c.lower(): c for c in known_cities if c}
+    for seg in reversed(segs):
+        low = seg.lower()
+        if low in lookup:
+            return lookup[low]
+        for key, city in lookup.items():
+            if low.startswith(key + " "):
+                return city
+    return segs[-1] if segs else ""
+
+def seed_events_if_empty(db_):
+    """Seed tabel events sekali dari data/eco_event.csv; rentang tanggal diparse di sini."""
+    if Event.query.first():
+        return
+    csv_path = os.path.join(os.path.dirname(__file__), "data", "eco_event.csv")
+    if not os.path.exists(csv_path):
+        print("[seed] Tidak menemukan data/eco_event.csv. Skip events.")
+        return
+
+    df = pd.read_csv(csv_path).fillna("")
+    cities = [c for (c,) in db_.session.query(Place.city).distinct()]
+    rows, bad = [], 0
+    for _, r in df.iterrows():
+        start, end = parse_event_date_range(r.get("event_date", ""))
+        bad += start is None
+        rows.append(Event(
+            id=int(r["event_id"]),
+            event_name=str(r.get("event_name", "") or ""),
+            event_place=str(r.get("event_place", "") or ""),
+            event_about=str(r.get("event_about", "") or ""),
+            event_date=str(r.get("event_date", "") or ""),
+            start_date=start,
+            end_date=end,
+            city=_event_city(r.get("event_place", ""), cities),
+            image=str(r.get("event_img", "") or ""),
+        ))
+    db_.session.add_all(rows)
+    db_.session.commit()
+    print(f"[seed] events terisi: {len(rows)} baris. tanggal gagal diparse: {bad}")
@@ -2,6 +2,7 @@ import React, { useEffect, useState, useCallback } from "react";
 import { useParams } from "react-router-dom";
 import { api } from "../api";
 import RatingStars from "../components/RatingStars";
+import PlaceCard from "../components/PlaceCard";
 import { asPriceText, formatRating } from "../utils/format";
 
 export default function Detail() {
@@ -9,6 +10,8 @@ export default function Detail() {
   const [p, setP] = useState(null);
   const [comments, setComments] = useState([]);
   const [ratingsPub, setRatingsPub] = useState({ avg: 0, count: 0, items: [] });
+  const [similar, setSimilar] = useState([]);
+  const [events, setEvents] = useState([]);
   const [myRating, setMyRating] = useState(0);
   const [text, setText] = useState("");
   const [busy, setBusy] = useState(false);
@@ -31,14 +34,24 @@ export default function Detail() {
     setRatingsPub(rr.data || { avg: 0, count: 0, items: [] });
   }, [id]);
 
+  const loadSimilar = useCallback(async () => {
+    const sr = await api.get(`/api/places/${id}/similar?k=6`);
+    setSimilar(sr.data || []);
+  }, [id]);
+
+  const loadEvents = useCallback(async () => {
+    const er = await api.get(`/api/places/${id}/events?limit=5`);
+    setEvents(er.data || []);
+  }, [id]);
+
   const loadAll = useCallback(async () => {
     setBusy(true);
     try {
-      await Promise.all([loadPlace(), loadComments(), loadRatingsPub()]);
+      await Promise.all([loadPlace(), loadComments(), loadRatingsPub(), loadSimilar(), loadEvents()]);
     } finally {
       setBusy(false);
     }
-  }, [loadPlace, loadComments, loadRatingsPub]);
+  }, [loadPlace, loadComments, loadRatingsPub, loadSimilar, loadEvents]);
 
   useEffect(() => {
     loadAll();
@@ -62,7 +75,10 @@ export default function Detail() {
       const r = await api.post("/api/ratings", { place_id: Number(id), rating: myRating });
       const { avg, count } = r.data || {};
       // update angka agregat di UI tanpa reload penuh
-      setP((prev) => prev ? { ...prev, rating: avg, rating_count: count } : prev);
+      // (mode write-behind: avg/count null → agregat menyusul, tetap pakai yang lama)
+      if (avg != null) {
+        setP((prev) => prev ? { ...prev, rating: avg, rating_count: count } : prev);
+      }
       await loadRatingsPub(); // refresh daftar rating publik
       alert("Rating disimpan");
 
@@ -218,6 +234,48 @@ export default function Detail() {
           )}
         </div>
       </div>
+
+      {/* Event eco di kota yang sama (events.city = places.city) */}
+      {events.length > 0 && (
+        <div className="mt-6">
+          <h2 className="font-semibold mb-2">Event di {p.city}</h2>
+          <div className="space-y-2">
+            {events.map((ev) => {
+              const past = ev.end_date && new Date(ev.end_date) < new Date(new Date().toDateString());
+              return (
+                <div key={ev.event_id} className="bg-white p-3 rounded border flex gap-3">
+                  {ev.image && (
+                    <img
+                      src={ev.image}
+                      alt={ev.event_name}
+                      className="w-20 h-20 object-cover rounded"
+                    />
+                  )}
+                  <div>
+                    <div className="font-medium">{ev.event_name}</div>
+                    <div className="text-sm text-gray-500">
+                      {ev.event_date} • {ev.event_place}
+                      {past && <span className="ml-1">(Selesai)</span>}
+                    </div>
+                  </div>
+                </div>
+              );
+            })}
+          </div>
+        </div>
+      )}
+
+      {/* Tempat serupa (tabel tetangga hybrid dari backend) */}
+      {similar.length > 0 && (
+        <div className="mt-6">
+          <h2 className="font-semibold mb-2">Tempat Serupa</h2>
+          <div className="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 gap-4">
+            {similar.map((sp) => (
+              <PlaceCard key={sp.place_id ?? sp.id} p={sp} />
+            ))}
+          </div>
+        </div>
+      )}
     </div>
   );
 }